@@ -15,7 +15,7 @@ import json
 import io
 import csv
 
-from app.db_utils import get_conversation_history, get_conversation_stats
+from app.db_utils import aget_conversation_history, aget_conversation_stats
 from app.services.conversation_log_service import conversation_log_service
 
 router = APIRouter()
@@ -41,6 +41,7 @@ class ConversationHistoryResponse(BaseModel):
     message: str
     data: List[ConversationRecord]
     total: int
+    next_before_id: Optional[int] = None
 
 
 class ConversationStatsResponse(BaseModel):
@@ -56,16 +57,18 @@ async def get_conversation_history_api(
     sender_id: Optional[str] = Query(None, description="发送者ID"),
     limit: int = Query(50, ge=1, le=1000, description="返回记录数量限制"),
     offset: int = Query(0, ge=0, description="偏移量"),
+    before_id: Optional[int] = Query(None, description="游标分页：上一页返回的 next_before_id"),
 ):
     """
     获取对话历史记录
     """
     try:
-        records = get_conversation_history(
+        records = await aget_conversation_history(
             conversation_id=conversation_id,
             sender_id=sender_id,
             limit=limit,
-            offset=offset
+            offset=offset,
+            before_id=before_id,
         )
 
         # 转换为响应模型
@@ -88,7 +91,8 @@ async def get_conversation_history_api(
             success=True,
             message="获取对话历史成功",
             data=conversation_records,
-            total=len(conversation_records)
+            total=len(conversation_records),
+            next_before_id=records[-1][0] if len(records) == limit else None,
         )
 
     except Exception as e:
@@ -110,7 +114,7 @@ async def get_conversation_stats_api(
         start_date_str = start_date.strftime("%Y-%m-%d") if start_date else None
         end_date_str = end_date.strftime("%Y-%m-%d") if end_date else None
 
-        stats = get_conversation_stats(
+        stats = await aget_conversation_stats(
             conversation_id=conversation_id,
             sender_id=sender_id,
             start_date=start_date_str,
@@ -141,7 +145,7 @@ async def get_recent_conversations(
         start_time = datetime.now() - timedelta(hours=hours)
         start_date_str = start_time.strftime("%Y-%m-%d")
 
-        records = get_conversation_history(
+        records = await aget_conversation_history(
             limit=limit,
             offset=0
         )
@@ -191,13 +195,13 @@ async def get_user_conversation_summary(
         start_date_str = start_date.strftime("%Y-%m-%d")
 
         # 获取用户统计信息
-        stats = get_conversation_stats(
+        stats = await aget_conversation_stats(
             sender_id=user_id,
             start_date=start_date_str
         )
 
         # 获取最近的对话记录
-        recent_records = get_conversation_history(
+        recent_records = await aget_conversation_history(
             sender_id=user_id,
             limit=10,
             offset=0
@@ -384,11 +384,11 @@ async def health_check(
     """
     try:
         # 简单的健康检查
-        from app.db_utils import get_conn
+        from app.db_utils import ping_db
+        from app.utils.async_utils import run_blocking
 
         # 检查数据库连接
-        conn = get_conn()
-        conn.close()
+        await run_blocking(ping_db)
 
         return {
             "status": "healthy",
@@ -8,10 +8,25 @@
 import os
 from typing import Optional
 
+from dotenv import load_dotenv
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+_ENV_LOADED = False
+
+
+def load_env() -> None:
+    """加载 .env 到进程环境变量，整个进程只执行一次"""
+    global _ENV_LOADED
+    if not _ENV_LOADED:
+        load_dotenv()
+        _ENV_LOADED = True
+
+
+load_env()
+
+
 class Settings(BaseSettings):
     """应用配置类"""
 
@@ -20,11 +35,18 @@ class Settings(BaseSettings):
     DINGTALK_CLIENT_ID: str = Field(..., description="钉钉开放平台 Client ID (AppKey)")
     DINGTALK_CLIENT_SECRET: str = Field(..., description="钉钉开放平台 Client Secret (AppSecret)")
     DINGTALK_ROBOT_CODE: str = Field(..., description="钉钉机器人编码")
+    DINGTALK_AI_CARD_TEMPLATE_ID: Optional[str] = Field(
+        None, description="钉钉 AI 卡片模板 ID，配置后以流式卡片回复消息"
+    )
+    DINGTALK_AI_CARD_CONTENT_KEY: str = Field("content", description="AI 卡片模板中承载回复正文的变量名")
 
     # API服务配置
     API_HOST: str = Field("0.0.0.0", description="API服务监听地址")
     API_PORT: int = Field(8000, description="API服务监听端口")
     DEBUG: bool = Field(False, description="调试模式")
+    THREAD_POOL_SIZE: Optional[int] = Field(
+        None, description="默认线程池大小，未设置时按 CPU 核数计算（IO 密集型）"
+    )
 
     # JIRA配置
     JIRA_URL: Optional[str] = Field(None, description="JIRA服务地址")
@@ -35,6 +57,7 @@ class Settings(BaseSettings):
     # AI服务配置
     OPENAI_API_KEY: Optional[str] = Field(None, description="OpenAI API密钥")
     GEMINI_API_KEY: Optional[str] = Field(None, description="Google Gemini API密钥")
+    LLM_CACHE_TTL: int = Field(3600, description="模型响应缓存有效期（秒），0 表示不缓存")
 
     # 天气服务配置
     OPENWEATHER_API_KEY: Optional[str] = Field(
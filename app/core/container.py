@@ -8,6 +8,7 @@
 
 from dependency_injector import containers, providers
 from dependency_injector.wiring import Provide, inject
+from fastapi import Request
 from typing import Optional
 
 from app.core.config import settings
@@ -186,9 +187,9 @@ async def cleanup_container():
 
 
 # 用于FastAPI依赖注入的函数
-async def get_knowledge_retriever_dependency() -> KnowledgeRetriever:
-    """FastAPI依赖注入：获取知识库检索器"""
-    retriever = get_knowledge_retriever()
+async def get_knowledge_retriever_dependency(request: Request) -> KnowledgeRetriever:
+    """FastAPI依赖注入：获取知识库检索器（优先使用启动时缓存在 app.state 上的实例）"""
+    retriever = request.app.state.knowledge_retriever or get_knowledge_retriever()
     if not retriever.initialized:
         from fastapi import HTTPException
         raise HTTPException(status_code=503, detail="知识库服务当前不可用")
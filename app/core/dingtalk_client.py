@@ -8,65 +8,61 @@
 # 全局钉钉客户端实例，用于在消息处理器中访问
 global_dingtalk_client = None
 
-import time
+import asyncio
 import json
-from typing import Optional
-
-from alibabacloud_dingtalk.oauth2_1_0.client import Client as DingTalkOAuthClient
-from alibabacloud_dingtalk.robot_1_0.client import Client as DingTalkRobotClient
-from alibabacloud_dingtalk.oauth2_1_0 import models as oauth_models
-from alibabacloud_dingtalk.robot_1_0 import models as robot_models
-from alibabacloud_tea_openapi import models as open_api_models
-from alibabacloud_tea_util import models as util_models
-from dingtalk_stream import AckMessage, DingTalkStreamClient, Credential, ChatbotHandler, ChatbotMessage
+import multiprocessing
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Optional
+
+from dingtalk_stream import AckMessage, ChatbotHandler, ChatbotMessage
 from loguru import logger
 
 from app.core.config import settings
-from app.services.ai.handler import AIMessageHandler
-from app.services.knowledge.retriever import KnowledgeRetriever # 新增导入
-from autogen_ext.memory.chromadb import ChromaDBVectorMemory # 新增导入
+from app.utils.async_utils import run_blocking
+
+# 主进程内待处理消息队列的容量与消费协程数量：队列满时转发线程阻塞，形成背压
+EVENT_QUEUE_SIZE = 256
+EVENT_WORKERS = 4
+
+# 阿里云 SDK、AutoGen 和 ChromaDB 依赖较重，仅在实际使用时导入，缩短冷启动时间
+if TYPE_CHECKING:
+    from app.services.knowledge.retriever import KnowledgeRetriever
 
 
 class DingTalkClient:
     """钉钉客户端类，管理钉钉Stream连接和消息处理"""
 
-    def __init__(self, knowledge_retriever: Optional[KnowledgeRetriever] = None):
+    def __init__(self, knowledge_retriever: Optional["KnowledgeRetriever"] = None):
         """初始化钉钉客户端"""
+        from app.services.ai.handler import AIMessageHandler
+
         self.client_id = settings.DINGTALK_CLIENT_ID
         self.client_secret = settings.DINGTALK_CLIENT_SECRET
         self.robot_code = settings.DINGTALK_ROBOT_CODE
         self._token_cache = {"token": None, "expire": 0}
-        self.stream_client = None
 
-        shared_vector_memory: Optional[ChromaDBVectorMemory] = None
+        shared_vector_memory = None
         if knowledge_retriever and knowledge_retriever.initialized:
             shared_vector_memory = knowledge_retriever.vector_memory
             logger.info("DingTalkClient接收到共享的vector_memory")
         else:
             logger.warning("DingTalkClient未接收到有效的共享vector_memory，知识库功能可能受限")
 
-        self.ai_handler = AIMessageHandler(vector_memory=shared_vector_memory)
+        # 复用依赖注入容器中的单例处理器（容器初始化时已注入同一个 vector_memory），
+        # 避免重复构建模型客户端和智能体；向量内存不一致时才单独创建
+        from app.core.container import get_ai_message_handler
+
+        ai_handler = get_ai_message_handler()
+        if ai_handler.shared_vector_memory is not shared_vector_memory:
+            ai_handler = AIMessageHandler(vector_memory=shared_vector_memory)
+        self.ai_handler = ai_handler
 
         # 设置全局实例引用，便于其他模块访问
         global global_dingtalk_client
         global_dingtalk_client = self
 
-        # 初始化stream客户端
-        self._init_stream_client()
-
-    def _init_stream_client(self):
-        """初始化钉钉Stream客户端"""
-        logger.info("初始化钉钉Stream客户端")
-        credential = Credential(self.client_id, self.client_secret)
-        self.stream_client = DingTalkStreamClient(credential)
-
-        # 注册消息处理器
-        self.stream_client.register_callback_handler(
-            ChatbotMessage.TOPIC,
-            RobotMessageHandler(self)
-        )
-        # 不在这里调用start_forever，避免异步循环冲突
-
     def get_access_token(self) -> Optional[str]:
         """
         获取钉钉访问令牌，带本地缓存，2小时有效期，提前200秒刷新
@@ -75,6 +71,10 @@ class DingTalkClient:
         if self._token_cache["token"] and now < self._token_cache["expire"]:
             return self._token_cache["token"]
 
+        from alibabacloud_dingtalk.oauth2_1_0 import models as oauth_models
+        from alibabacloud_dingtalk.oauth2_1_0.client import Client as DingTalkOAuthClient
+        from alibabacloud_tea_openapi import models as open_api_models
+
         logger.info("获取钉钉访问令牌")
         config = open_api_models.Config(protocol="https", region_id="central")
         client = DingTalkOAuthClient(config)
@@ -112,6 +112,11 @@ class DingTalkClient:
             logger.error("发送群消息失败: 无法获取访问令牌")
             return None
 
+        from alibabacloud_dingtalk.robot_1_0 import models as robot_models
+        from alibabacloud_dingtalk.robot_1_0.client import Client as DingTalkRobotClient
+        from alibabacloud_tea_openapi import models as open_api_models
+        from alibabacloud_tea_util import models as util_models
+
         config = open_api_models.Config(protocol="https", region_id="central")
         client = DingTalkRobotClient(config)
 
@@ -161,6 +166,11 @@ class DingTalkClient:
             logger.error("发送私聊消息失败: 无法获取访问令牌")
             return None
 
+        from alibabacloud_dingtalk.robot_1_0 import models as robot_models
+        from alibabacloud_dingtalk.robot_1_0.client import Client as DingTalkRobotClient
+        from alibabacloud_tea_openapi import models as open_api_models
+        from alibabacloud_tea_util import models as util_models
+
         config = open_api_models.Config(protocol="https", region_id="central")
         client = DingTalkRobotClient(config)
 
@@ -196,53 +206,115 @@ class DingTalkClient:
             logger.error(f"发送私聊消息失败: {e}")
             return None
 
-    def start_forever(self):
-        """启动钉钉Stream客户端，永久运行"""
-        if not self.stream_client:
-            self._init_stream_client()
-
-        logger.info("启动钉钉Stream客户端")
-        self.stream_client.start_forever()
+    def start_stream_process(self) -> multiprocessing.Process:
+        """
+        在独立子进程中运行钉钉Stream连接，避免长连接收发与请求处理争用GIL
 
-    def stop(self):
-        """停止钉钉Stream客户端"""
-        if self.stream_client:
-            logger.info("停止钉钉Stream客户端")
-            try:
-                # 尝试关闭连接，如果SDK未来支持这个方法
-                if hasattr(self.stream_client, 'stop'):
-                    self.stream_client.stop()
-                # 设置为None以便垃圾回收
-                self.stream_client = None
-                logger.info("钉钉Stream客户端已停止")
-            except Exception as e:
-                logger.warning(f"停止钉钉Stream客户端时出现异常: {e}")
-                # 即使出现异常，也要重置状态
-                self.stream_client = None
-
-
-class RobotMessageHandler(ChatbotHandler):
-    """机器人消息处理器"""
-
-    def __init__(self, dingtalk_client):
-        """初始化消息处理器"""
-        super(ChatbotHandler, self).__init__()
-        # 将客户端实例存储为类变量
-        # 注意：类型提示可能导致错误，移除以避免混淆
-        self._client = dingtalk_client
+        子进程只负责收消息并立即应答，消息数据经进程队列转发回主进程，
+        由转发线程放入有界队列，再由固定数量的消费协程调用 handle_callback_data 处理。
+        """
+        loop = asyncio.get_running_loop()
+        ctx = multiprocessing.get_context("spawn")
+        self._events = ctx.Queue()
+        self._stream_process = ctx.Process(
+            target=run_stream_process,
+            args=(self._events, self.client_id, self.client_secret),
+            name="dingtalk-stream",
+            daemon=True,
+        )
+        self._stream_process.start()
+        self._pin_stream_process()
+
+        # 有界队列 + 固定数量的消费协程，突发流量下不会无限制地创建处理任务
+        self._event_q: asyncio.Queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self._event_workers = [
+            asyncio.create_task(self._consume_events(), name=f"dingtalk-worker-{i}")
+            for i in range(EVENT_WORKERS)
+        ]
+
+        self._forward_thread = threading.Thread(
+            target=self._forward_events,
+            args=(loop,),
+            name="dingtalk-events",
+            daemon=True,
+        )
+        self._forward_thread.start()
+        logger.info(f"钉钉Stream子进程已启动，PID: {self._stream_process.pid}")
+        return self._stream_process
 
-        # 获取AI处理器实例，假设它在dingtalk_client中存在
-        if hasattr(dingtalk_client, 'ai_handler'):
-            self.ai_handler = dingtalk_client.ai_handler
-        else:
-            logger.error("未找到AI处理器实例")
-            self.ai_handler = None
+    def _pin_stream_process(self) -> None:
+        """
+        Linux 下将Stream子进程绑定到当前进程可用的最后一个CPU核心，减少上下文切换，把其余核心留给主进程
 
-    async def process(self, callback):
-        """处理接收到的消息"""
+        可用核心取自进程的亲和性掩码（容器 cgroup/cpuset 限制后的集合）；只有一个可用核心或绑定失败时不做处理。
+        """
+        if not hasattr(os, "sched_getaffinity"):
+            return
+        try:
+            allowed = os.sched_getaffinity(0)
+            if len(allowed) < 2:
+                return
+            cpu = max(allowed)
+            os.sched_setaffinity(self._stream_process.pid, {cpu})
+            logger.info(f"钉钉Stream子进程已绑定到CPU {cpu}")
+        except OSError as e:
+            logger.info(f"未绑定钉钉Stream子进程CPU: {e}")
+
+    def _forward_events(self, loop: asyncio.AbstractEventLoop) -> None:
+        """转发线程：从进程队列读取消息放入有界队列，队列满时阻塞等待，收到 None 时退出"""
+        while True:
+            data = self._events.get()
+            if data is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._event_q.put(data), loop).result()
+            except (RuntimeError, asyncio.CancelledError):
+                # 事件循环已关闭，停止转发
+                return
+
+    async def _consume_events(self) -> None:
+        """消费协程：逐条处理队列中的消息"""
+        while True:
+            data = await self._event_q.get()
+            try:
+                await self.handle_callback_data(data)
+            finally:
+                self._event_q.task_done()
+
+    async def stop_event_workers(self) -> None:
+        """取消消息消费协程，未处理的消息随之丢弃"""
+        workers = getattr(self, "_event_workers", [])
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._event_workers = []
+
+    def stop_stream_process(self, timeout: float = 2.0) -> None:
+        """停止钉钉Stream子进程和转发线程"""
+        process = getattr(self, "_stream_process", None)
+        if process is None:
+            return
+        logger.info("停止钉钉Stream子进程")
+        self._events.put(None)
+        process.terminate()
+        process.join(timeout=timeout)
+        if process.is_alive():
+            logger.warning("钉钉Stream子进程未在超时时间内退出，强制结束")
+            process.kill()
+            process.join()
+        self._stream_process = None
+
+        # 等待转发线程读到 None 后真正退出，而不是固定等待一段时间
+        self._forward_thread.join(timeout=timeout)
+        if self._forward_thread.is_alive():
+            logger.warning("钉钉消息转发线程未在超时时间内退出")
+        logger.info("钉钉Stream子进程已停止")
+
+    async def handle_callback_data(self, data: dict):
+        """处理一条机器人消息回调数据：调用AI处理器生成回复并发送"""
         try:
             # 解析消息
-            incoming_message = ChatbotMessage.from_dict(callback.data)
+            incoming_message = ChatbotMessage.from_dict(data)
 
             # 获取消息信息
             conversation_id = incoming_message.conversation_id
@@ -267,28 +339,56 @@ class RobotMessageHandler(ChatbotHandler):
                 logger.error("无法处理消息：AI处理器未初始化")
                 return "ERROR", "系统内部错误"
 
+            # 配置了 AI 卡片模板时先投放卡片，生成过程中流式刷新；投放失败则退回普通消息
+            card = None
+            if settings.DINGTALK_AI_CARD_TEMPLATE_ID:
+                from app.services.dingtalk.ai_card import AICardReplier
+
+                card = AICardReplier(self, conversation_id, sender_id, bool(is_group_chat))
+                if not await card.start():
+                    card = None
+
             response = await self.ai_handler.process_message(
                 text_content,
                 sender_id,
-                conversation_id
+                conversation_id,
+                stream_callback=card.append if card else None,
             )
 
-            # 发送回复 - 调用全局DingTalkClient实例的方法
+            # 发送回复
             if response:
-                from app.core.dingtalk_client import global_dingtalk_client
-                if not global_dingtalk_client:
-                    logger.error("无法发送消息：全局钉钉客户端未初始化")
-                    return "ERROR", "全局客户端未初始化"
-
                 # 根据消息类型选择发送方式
-                if is_group_chat:
-                    # 群聊回复
-                    global_dingtalk_client.send_group_message(conversation_id, response)
+                if card is not None and await card.finish(response):
+                    pass
+                elif is_group_chat:
+                    # 群聊回复；SDK 为同步调用，放到线程池执行，避免阻塞事件循环
+                    await run_blocking(self.send_group_message, conversation_id, response)
                 else:
                     # 单聊回复 - 需要用户ID列表
-                    global_dingtalk_client.send_private_message([sender_id], response)
+                    await run_blocking(self.send_private_message, [sender_id], response)
 
             return AckMessage.STATUS_OK, "OK"
         except Exception as e:
             logger.error(f"处理消息异常: {e}")
             return "ERROR", str(e)
+
+
+class _ForwardingHandler(ChatbotHandler):
+    """子进程中的消息处理器：不做业务处理，立即应答并把回调数据转发给主进程"""
+
+    def __init__(self, events):
+        super(ChatbotHandler, self).__init__()
+        self._events = events
+
+    async def process(self, callback):
+        self._events.put(callback.data)
+        return AckMessage.STATUS_OK, "OK"
+
+
+def run_stream_process(events, client_id: str, client_secret: str) -> None:
+    """钉钉Stream子进程入口：建立长连接并转发机器人消息"""
+    from dingtalk_stream import Credential, DingTalkStreamClient
+
+    stream_client = DingTalkStreamClient(Credential(client_id, client_secret))
+    stream_client.register_callback_handler(ChatbotMessage.TOPIC, _ForwardingHandler(events))
+    stream_client.start_forever()
@@ -6,14 +6,81 @@
 """
 
 import asyncio
-import schedule
 from datetime import datetime
+from functools import partial
+from typing import Any, Awaitable, Callable
 from loguru import logger
 
 from app.core.logger import cleanup_logs
 from app.services.jira.tasks import check_jira_tasks_compliance
 from app.core.container import get_weekly_report_service
 from app.services.conversation_log_service import cleanup_conversation_logs
+from app.utils.cron import next_fire_time
+
+# 定时任务 cron 表达式（本地时间，格式：分 时 日 月 周）
+# 工作日每天上午10点和下午4点检查JIRA任务
+CRON_JIRA = "0 10,16 * * MON-FRI"
+# 每天凌晨2点清理过期日志文件
+CRON_CLEANUP_LOGS = "0 2 * * *"
+# 每周一凌晨3点清理7天前的对话记录
+CRON_CLEANUP_CONVERSATIONS = "0 3 * * MON"
+# 每周六20:30执行周报生成任务
+CRON_WEEKLY_REPORT = "30 20 * * SAT"
+
+# 单次休眠的最长时间（秒），防止系统时间调整或休眠唤醒后长时间错过任务
+_MAX_SLEEP_SECONDS = 3600
+
+# 调度器派发的后台任务集合，持有强引用避免任务在执行中被回收
+_BG_TASKS: set[asyncio.Task] = set()
+
+
+async def _run_logged(factory: Callable[[], Awaitable[Any]], name: str) -> None:
+    """执行定时任务协程并记录异常，避免异常被静默吞掉"""
+    try:
+        await factory()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"定时任务 {name} 执行异常: {e}", exc_info=True)
+
+
+def _spawn_tracked(factory: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+    """创建受管理的后台任务，任务结束后自动从集合中移除"""
+    name = getattr(getattr(factory, "func", factory), "__name__", "job")
+    task = asyncio.create_task(_run_logged(factory, name), name=f"scheduler:{name}")
+    _BG_TASKS.add(task)
+    task.add_done_callback(_BG_TASKS.discard)
+    return task
+
+
+async def drain_background_tasks(timeout: float = 10.0) -> None:
+    """等待调度器派发的后台任务结束，超时后取消剩余任务（应用关闭时调用）"""
+    if not _BG_TASKS:
+        return
+    tasks = list(_BG_TASKS)
+    logger.info(f"等待 {len(tasks)} 个定时任务结束...")
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+        logger.warning(f"{len(pending)} 个定时任务超时未完成，已取消")
+
+
+async def _run_cron_job(expression: str, factory: Callable[[], Awaitable[Any]]) -> None:
+    """按 cron 表达式循环等待并派发单个定时任务"""
+    last_fire = datetime.now()
+    while True:
+        fire_at = next_fire_time(expression, last_fire)
+        delay = (fire_at - datetime.now()).total_seconds()
+        while delay > 0:
+            await asyncio.sleep(min(delay, _MAX_SLEEP_SECONDS))
+            # 醒来后重新计算剩余时间，未到期则继续休眠
+            delay = (fire_at - datetime.now()).total_seconds()
+
+        _spawn_tracked(factory)
+        # 以本次触发时间为基准计算下一次，避免提前唤醒时重复触发
+        last_fire = fire_at
 
 
 async def start_scheduler():
@@ -22,37 +89,16 @@ async def start_scheduler():
     """
     logger.info("启动定时任务调度器")
 
-    # 配置定时任务
-    # 工作日每天上午10点和下午4点检查JIRA任务
-    schedule.every().monday.at("10:00").do(lambda: asyncio.create_task(check_jira_tasks_compliance()))
-    schedule.every().monday.at("16:00").do(lambda: asyncio.create_task(check_jira_tasks_compliance()))
-    schedule.every().tuesday.at("10:00").do(lambda: asyncio.create_task(check_jira_tasks_compliance()))
-    schedule.every().tuesday.at("16:00").do(lambda: asyncio.create_task(check_jira_tasks_compliance()))
-    schedule.every().wednesday.at("10:00").do(lambda: asyncio.create_task(check_jira_tasks_compliance()))
-    schedule.every().wednesday.at("16:00").do(lambda: asyncio.create_task(check_jira_tasks_compliance()))
-    schedule.every().thursday.at("10:00").do(lambda: asyncio.create_task(check_jira_tasks_compliance()))
-    schedule.every().thursday.at("16:00").do(lambda: asyncio.create_task(check_jira_tasks_compliance()))
-    schedule.every().friday.at("10:00").do(lambda: asyncio.create_task(check_jira_tasks_compliance()))
-    schedule.every().friday.at("16:00").do(lambda: asyncio.create_task(check_jira_tasks_compliance()))
-
-    # 每天凌晨2点清理过期日志文件
-    schedule.every().day.at("02:00").do(lambda: asyncio.create_task(cleanup_logs_task()))
-
-    # 每周一凌晨3点清理7天前的对话记录
-    schedule.every().monday.at("03:00").do(lambda: asyncio.create_task(cleanup_conversation_logs_task(days=7)))
-
-    # 每周六20:30执行周报生成任务
-    schedule.every().saturday.at("20:30").do(lambda: asyncio.create_task(weekly_report_task()))
-
-    # 运行调度器
+    # 每个任务独立等待自己的触发时间，互不影响
     try:
-        while True:
-            schedule.run_pending()
-            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            logger.debug(f"定时任务调度器运行中... {now}")
-            await asyncio.sleep(3600)  # 每小时检查一次
+        await asyncio.gather(*(
+            asyncio.create_task(_run_cron_job(expression, factory), name=f"cron:{expression}")
+            for expression, factory in JOBS
+        ))
     except asyncio.CancelledError:
         logger.info("定时任务调度器已停止")
+        # 继续向上传播，让等待方确认任务已被取消
+        raise
     except Exception as e:
         logger.error(f"定时任务调度器异常: {e}")
         raise
@@ -94,51 +140,18 @@ async def weekly_report_task():
         result = await weekly_service.auto_weekly_report_task()
 
         if result["success"]:
-            logger.info("周报生成任务执行成功")
-
-            # 发送成功通知到钉钉机器人
-            from app.core.dingtalk_client import global_dingtalk_client
-            if global_dingtalk_client:
-                success_message = f"""周报自动生成成功
-
-                    任务执行时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-                    日志数量: {result['data']['logs_info']['logs_count']}
-                    AI总结模式: {result['data']['summary_info']['mode']}
-                    钉钉日报ID: {result['data']['send_info']['report_id']}
-
-                周报已自动发送到钉钉，请查收！"""
-
-                # 这里可以添加发送消息到特定群聊的逻辑
-                logger.info("周报生成成功通知已准备发送")
+            logger.info("周报生成任务执行成功，周报已自动发送到钉钉")
         else:
             logger.error(f"周报生成任务失败: {result['message']}")
 
-            # 发送失败通知
-            from app.core.dingtalk_client import global_dingtalk_client
-            if global_dingtalk_client:
-                error_message = f"""周报自动生成失败
-
-失败时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-失败原因: {result['message']}
-
-请检查系统状态或手动生成周报。"""
-
-                logger.warning("周报生成失败通知已准备发送")
-
     except Exception as e:
         logger.error(f"周报生成任务异常: {e}")
 
-        # 发送异常通知
-        try:
-            from app.core.dingtalk_client import global_dingtalk_client
-            if global_dingtalk_client:
-                exception_message = f"""周报生成任务异常
-
-异常时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-异常信息: {str(e)}
-
-请联系管理员检查系统状态。"""
 
-                logger.error("周报生成异常通知已准备发送")
-        except:
-            pass  # 避免通知发送失败影响主任务
+# 定时任务表：(cron 表达式, 任务协程工厂)，模块加载时构建一次
+JOBS = (
+    (CRON_JIRA, check_jira_tasks_compliance),
+    (CRON_CLEANUP_LOGS, cleanup_logs_task),
+    (CRON_CLEANUP_CONVERSATIONS, partial(cleanup_conversation_logs_task, days=7)),
+    (CRON_WEEKLY_REPORT, weekly_report_task),
+)
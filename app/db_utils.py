@@ -1,13 +1,175 @@
+import asyncio
+import json
 import sqlite3
-from typing import Optional, Tuple, List, Dict, Any
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple, List, Dict, Any
 from datetime import datetime, timedelta
 from app.utils.time_utils import get_beijing_time_str
+from app.utils.async_utils import run_blocking
 
 DB_PATH = "user_data.db"
 
+# ========== SQL 语句常量：模块加载时创建一次，配合长连接复用 SQLite 语句缓存 ==========
+
+_SQL_SAVE_COLUMN_COMMENT = (
+    "INSERT OR REPLACE INTO columns_comment (table_name, column_name, comment) VALUES (?, ?, ?)"
+)
+_SQL_GET_COLUMN_COMMENT = (
+    "SELECT comment FROM columns_comment WHERE table_name = ? AND column_name = ?"
+)
+_SQL_GET_TABLE_COMMENTS = "SELECT column_name, comment FROM columns_comment WHERE table_name = ?"
+
+_SQL_GET_JIRA_ACCOUNT = (
+    "SELECT jira_username, jira_password FROM user_jira_account WHERE user_id = ?"
+)
+_SQL_SAVE_JIRA_ACCOUNT = (
+    "INSERT OR REPLACE INTO user_jira_account (user_id, jira_username, jira_password, updated_at) "
+    "VALUES (?, ?, ?, CURRENT_TIMESTAMP)"
+)
+_SQL_GET_FIRST_USER_ID = "SELECT user_id FROM user_jira_account ORDER BY id LIMIT 1"
+
+_SQL_SAVE_WEEKLY_LOG = """
+    INSERT INTO weekly_logs
+    (user_id, week_start_date, week_end_date, log_content, summary_content, dingtalk_report_id)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+_SQL_UPDATE_WEEKLY_LOG_SUMMARY = (
+    "UPDATE weekly_logs SET summary_content = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?"
+)
+_SQL_UPDATE_WEEKLY_LOG_DINGTALK_ID = (
+    "UPDATE weekly_logs SET dingtalk_report_id = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?"
+)
+_SQL_GET_WEEKLY_LOGS_BY_RANGE = """
+    SELECT id, user_id, week_start_date, week_end_date, log_content,
+           summary_content, dingtalk_report_id, created_at, updated_at
+    FROM weekly_logs
+    WHERE user_id = ? AND week_start_date >= ? AND week_end_date <= ?
+    ORDER BY week_start_date
+"""
+_SQL_GET_LATEST_WEEKLY_LOG = """
+    SELECT id, user_id, week_start_date, week_end_date, log_content,
+           summary_content, dingtalk_report_id, created_at, updated_at
+    FROM weekly_logs
+    WHERE user_id = ?
+    ORDER BY created_at DESC, id DESC
+    LIMIT 1
+"""
+
+_SQL_SAVE_CONVERSATION_RECORD = """
+    INSERT INTO conversation_records
+    (conversation_id, sender_id, user_question, ai_response, message_type, response_time_ms, agent_type, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# 业务表字段注释，运行期不变：启动时写入 columns_comment 表，读取时直接查内存
+_COLUMN_COMMENTS: Dict[str, Dict[str, str]] = {
+    "user_jira_account": {
+        "id": "主键",
+        "user_id": "钉钉用户 ID",
+        "jira_username": "Jira 登录名",
+        "jira_password": "Jira 密码 (建议加密)",
+        "created_at": "创建时间",
+        "updated_at": "更新时间",
+    },
+    "weekly_logs": {
+        "id": "主键",
+        "user_id": "钉钉用户 ID",
+        "week_start_date": "周开始日期",
+        "week_end_date": "周结束日期",
+        "log_content": "原始日志内容",
+        "summary_content": "AI总结后的内容",
+        "dingtalk_report_id": "钉钉日报ID",
+    },
+    "conversation_records": {
+        "id": "主键",
+        "conversation_id": "钉钉会话ID（群聊或单聊）",
+        "sender_id": "发送者钉钉用户ID",
+        "user_question": "用户提问内容",
+        "ai_response": "智能体回复内容",
+        "message_type": "消息类型（text/markdown/card等）",
+        "response_time_ms": "响应时间（毫秒）",
+        "agent_type": "处理的智能体类型",
+        "created_at": "创建时间",
+        "updated_at": "更新时间",
+    },
+}
+
+# 建表与列注释初始化只需执行一次，按数据库路径记录，首次获取连接时完成
+_INITIALIZED_PATHS: set[str] = set()
+_INIT_LOCK = threading.Lock()
+
+
+# 模块内部共享的长连接：WAL 模式 + 自动提交，所有访问通过锁串行化
+_SHARED_CONN: Optional[sqlite3.Connection] = None
+_SHARED_CONN_PATH: Optional[str] = None
+_SHARED_CONN_LOCK = threading.RLock()
+
+
+def _configure_conn(conn: sqlite3.Connection) -> None:
+    """设置连接级 PRAGMA：WAL 日志允许读写并发，NORMAL 同步在 WAL 下足够安全。"""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-20000")
+
 
 def get_conn():
     conn = sqlite3.connect(DB_PATH)
+    _init_once(conn)
+    return conn
+
+
+@contextmanager
+def _shared_conn() -> Iterator[sqlite3.Connection]:
+    """获取模块内部复用的长连接，持有锁期间独占使用。"""
+    global _SHARED_CONN, _SHARED_CONN_PATH
+    with _SHARED_CONN_LOCK:
+        if _SHARED_CONN is None or _SHARED_CONN_PATH != DB_PATH:
+            if _SHARED_CONN is not None:
+                _SHARED_CONN.close()
+            # isolation_level=None 为自动提交，每条写语句立即生效，无需显式 commit
+            _SHARED_CONN = sqlite3.connect(
+                DB_PATH, isolation_level=None, check_same_thread=False
+            )
+            _configure_conn(_SHARED_CONN)
+            _init_once(_SHARED_CONN)
+            _SHARED_CONN_PATH = DB_PATH
+        yield _SHARED_CONN
+
+
+def init_db() -> None:
+    """提前打开共享连接并完成建表初始化（应用启动时调用，避免首个请求承担初始化开销）。"""
+    with _shared_conn():
+        pass
+
+
+def close_shared_conn() -> None:
+    """关闭模块内部复用的长连接（应用退出时调用）。"""
+    global _SHARED_CONN, _SHARED_CONN_PATH
+    with _SHARED_CONN_LOCK:
+        if _SHARED_CONN is not None:
+            _SHARED_CONN.close()
+            _SHARED_CONN = None
+            _SHARED_CONN_PATH = None
+
+
+def _init_once(conn: sqlite3.Connection) -> None:
+    """确保当前数据库已完成建表和列注释初始化（每个进程每个库只执行一次）。"""
+    if DB_PATH in _INITIALIZED_PATHS:
+        return
+    with _INIT_LOCK:
+        if DB_PATH in _INITIALIZED_PATHS:
+            return
+        _init_db(conn)
+        _INITIALIZED_PATHS.add(DB_PATH)
+
+
+def _init_db(conn: sqlite3.Connection) -> None:
+    """创建业务表、索引并写入列注释元数据。"""
+    # 全部初始化语句放在同一事务中，只提交一次（共享连接为自动提交模式）
+    conn.execute("BEGIN")
+
     # 主业务表
     conn.execute(
         """
@@ -91,109 +253,67 @@ def get_conn():
         """
     )
 
-    # 初始化 user_jira_account 字段注释
-    _register_column_comments(
-        conn,
-        "user_jira_account",
-        {
-            "id": "主键",
-            "user_id": "钉钉用户 ID",
-            "jira_username": "Jira 登录名",
-            "jira_password": "Jira 密码 (建议加密)",
-            "created_at": "创建时间",
-            "updated_at": "更新时间",
-        },
+    # 为周报日志表创建索引：按用户+日期范围查询、按用户取最新记录
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_weekly_logs_user_range
+        ON weekly_logs(user_id, week_start_date, week_end_date)
+        """
     )
 
-    # 初始化 weekly_logs 字段注释
-    _register_column_comments(
-        conn,
-        "weekly_logs",
-        {
-            "id": "主键",
-            "user_id": "钉钉用户 ID",
-            "week_start_date": "周开始日期",
-            "week_end_date": "周结束日期",
-            "log_content": "原始日志内容",
-            "summary_content": "AI总结后的内容",
-            "dingtalk_report_id": "钉钉日报ID",
-        },
-    )
-    # 初始化 conversation_records 字段注释
-    _register_column_comments(
-        conn,
-        "conversation_records",
-        {
-            "id": "主键",
-            "conversation_id": "钉钉会话ID（群聊或单聊）",
-            "sender_id": "发送者钉钉用户ID",
-            "user_question": "用户提问内容",
-            "ai_response": "智能体回复内容",
-            "message_type": "消息类型（text/markdown/card等）",
-            "response_time_ms": "响应时间（毫秒）",
-            "agent_type": "处理的智能体类型",
-            "created_at": "创建时间",
-            "updated_at": "更新时间",
-        },
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_weekly_logs_user_created
+        ON weekly_logs(user_id, created_at DESC)
+        """
     )
 
-    return conn
+    # 写入各业务表的字段注释
+    _register_column_comments(conn, _COLUMN_COMMENTS)
+    conn.commit()
 
 
 def _register_column_comments(
-    conn: sqlite3.Connection, table: str, comments: dict[str, str]
+    conn: sqlite3.Connection, table_comments: Dict[str, Dict[str, str]]
 ) -> None:
-    """将列注释写入元数据表 (INSERT OR REPLACE)。"""
-    for col, com in comments.items():
-        conn.execute(
-            "INSERT OR REPLACE INTO columns_comment (table_name, column_name, comment) VALUES (?, ?, ?)",
-            (table, col, com),
-        )
-    conn.commit()
+    """将各表列注释一次性写入元数据表 (INSERT OR REPLACE)。"""
+    conn.executemany(
+        _SQL_SAVE_COLUMN_COMMENT,
+        [
+            (table, col, com)
+            for table, comments in table_comments.items()
+            for col, com in comments.items()
+        ],
+    )
 
 
 def get_column_comment(table: str, column: str) -> Optional[str]:
     """读取单个列注释。"""
-    conn = get_conn()
-    cur = conn.execute(
-        "SELECT comment FROM columns_comment WHERE table_name = ? AND column_name = ?",
-        (table, column),
-    )
-    row = cur.fetchone()
-    conn.close()
+    if table in _COLUMN_COMMENTS:
+        return _COLUMN_COMMENTS[table].get(column)
+    with _shared_conn() as conn:
+        row = conn.execute(_SQL_GET_COLUMN_COMMENT, (table, column)).fetchone()
     return row[0] if row else None
 
 
 def get_table_comments(table: str) -> dict[str, str]:
     """读取整张表的列注释。"""
-    conn = get_conn()
-    cur = conn.execute(
-        "SELECT column_name, comment FROM columns_comment WHERE table_name = ?",
-        (table,),
-    )
-    result = {col: com for col, com in cur.fetchall()}
-    conn.close()
+    if table in _COLUMN_COMMENTS:
+        return dict(_COLUMN_COMMENTS[table])
+    with _shared_conn() as conn:
+        result = dict(conn.execute(_SQL_GET_TABLE_COMMENTS, (table,)).fetchall())
     return result
 
 
 def get_jira_account(user_id: str) -> Optional[Tuple[str, str]]:
-    conn = get_conn()
-    cursor = conn.execute(
-        "SELECT jira_username, jira_password FROM user_jira_account WHERE user_id = ?", (user_id,)
-    )
-    row = cursor.fetchone()
-    conn.close()
+    with _shared_conn() as conn:
+        row = conn.execute(_SQL_GET_JIRA_ACCOUNT, (user_id,)).fetchone()
     return row if row else None
 
 
 def save_jira_account(user_id: str, username: str, password: str):
-    conn = get_conn()
-    conn.execute(
-        "INSERT OR REPLACE INTO user_jira_account (user_id, jira_username, jira_password, updated_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
-        (user_id, username, password),
-    )
-    conn.commit()
-    conn.close()
+    with _shared_conn() as conn:
+        conn.execute(_SQL_SAVE_JIRA_ACCOUNT, (user_id, username, password))
 
 
 # ========== 周报相关数据库操作 ==========
@@ -201,10 +321,8 @@ def save_jira_account(user_id: str, username: str, password: str):
 
 def get_first_user_id() -> Optional[str]:
     """获取数据库中第一个用户ID"""
-    conn = get_conn()
-    cursor = conn.execute("SELECT user_id FROM user_jira_account ORDER BY id LIMIT 1")
-    result = cursor.fetchone()
-    conn.close()
+    with _shared_conn() as conn:
+        result = conn.execute(_SQL_GET_FIRST_USER_ID).fetchone()
     return result[0] if result else None
 
 
@@ -217,78 +335,66 @@ def save_weekly_log(
     dingtalk_report_id: str = None,
 ) -> int:
     """保存周报日志"""
-    conn = get_conn()
-    cursor = conn.execute(
-        """
-        INSERT INTO weekly_logs
-        (user_id, week_start_date, week_end_date, log_content, summary_content, dingtalk_report_id)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """,
-        (user_id, week_start, week_end, log_content, summary_content, dingtalk_report_id),
-    )
-    log_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with _shared_conn() as conn:
+        cursor = conn.execute(
+            _SQL_SAVE_WEEKLY_LOG,
+            (user_id, week_start, week_end, log_content, summary_content, dingtalk_report_id),
+        )
+        log_id = cursor.lastrowid
     return log_id
 
 
 def update_weekly_log_summary(log_id: int, summary_content: str):
     """更新周报总结内容"""
-    conn = get_conn()
-    conn.execute(
-        "UPDATE weekly_logs SET summary_content = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-        (summary_content, log_id),
-    )
-    conn.commit()
-    conn.close()
+    with _shared_conn() as conn:
+        conn.execute(_SQL_UPDATE_WEEKLY_LOG_SUMMARY, (summary_content, log_id))
 
 
 def update_weekly_log_dingtalk_id(log_id: int, dingtalk_report_id: str):
     """更新钉钉日报ID"""
-    conn = get_conn()
-    conn.execute(
-        "UPDATE weekly_logs SET dingtalk_report_id = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-        (dingtalk_report_id, log_id),
-    )
-    conn.commit()
-    conn.close()
+    with _shared_conn() as conn:
+        conn.execute(_SQL_UPDATE_WEEKLY_LOG_DINGTALK_ID, (dingtalk_report_id, log_id))
 
 
 def get_weekly_logs_by_date_range(user_id: str, start_date: str, end_date: str) -> list:
     """根据日期范围获取周报日志"""
-    conn = get_conn()
-    cursor = conn.execute(
-        """
-        SELECT id, user_id, week_start_date, week_end_date, log_content,
-               summary_content, dingtalk_report_id, created_at, updated_at
-        FROM weekly_logs
-        WHERE user_id = ? AND week_start_date >= ? AND week_end_date <= ?
-        ORDER BY week_start_date
-        """,
-        (user_id, start_date, end_date),
-    )
-    results = cursor.fetchall()
-    conn.close()
+    with _shared_conn() as conn:
+        results = conn.execute(
+            _SQL_GET_WEEKLY_LOGS_BY_RANGE, (user_id, start_date, end_date)
+        ).fetchall()
     return results
 
 
 def get_latest_weekly_log(user_id: str) -> Optional[Tuple]:
     """获取用户最新的周报日志"""
-    conn = get_conn()
-    cursor = conn.execute(
-        """
+    with _shared_conn() as conn:
+        result = conn.execute(_SQL_GET_LATEST_WEEKLY_LOG, (user_id,)).fetchone()
+    return result
+
+
+def get_latest_weekly_logs_for_users(user_ids: List[str]) -> Dict[str, Tuple]:
+    """
+    批量获取多个用户各自最新的周报日志，返回 {user_id: 记录}，无记录的用户不出现在结果中
+
+    created_at 精度为秒，同一秒内保存的多条日志按 id 取最后写入的一条
+    """
+    if not user_ids:
+        return {}
+
+    placeholders = ", ".join("?" * len(user_ids))
+    query = f"""
         SELECT id, user_id, week_start_date, week_end_date, log_content,
                summary_content, dingtalk_report_id, created_at, updated_at
-        FROM weekly_logs
-        WHERE user_id = ?
-        ORDER BY created_at DESC
-        LIMIT 1
-        """,
-        (user_id,),
-    )
-    result = cursor.fetchone()
-    conn.close()
-    return result
+        FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at DESC, id DESC) AS rn
+            FROM weekly_logs
+            WHERE user_id IN ({placeholders})
+        )
+        WHERE rn = 1
+    """
+    with _shared_conn() as conn:
+        rows = conn.execute(query, list(user_ids)).fetchall()
+    return {row[1]: row for row in rows}
 
 
 def save_conversation_record(
@@ -317,30 +423,34 @@ def save_conversation_record(
     """
     # 使用北京时间（UTC+8）
     beijing_time = get_beijing_time_str()
-    
-    conn = get_conn()
-    cursor = conn.execute(
-        """
-        INSERT INTO conversation_records
-        (conversation_id, sender_id, user_question, ai_response, message_type, response_time_ms, agent_type, created_at, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            conversation_id,
-            sender_id,
-            user_question,
-            ai_response,
-            message_type,
-            response_time_ms,
-            agent_type,
-            beijing_time,
-            beijing_time
-        ),
+    params = (
+        conversation_id,
+        sender_id,
+        user_question,
+        ai_response,
+        message_type,
+        response_time_ms,
+        agent_type,
+        beijing_time,
+        beijing_time,
     )
-    record_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return record_id
+    return _insert_conversation_records([params])[0]
+
+
+def _insert_conversation_records(rows: List[Tuple]) -> List[int]:
+    """在同一个事务中插入多条对话记录，返回各记录的ID。"""
+    with _shared_conn() as conn:
+        conn.execute("BEGIN")
+        try:
+            record_ids = [
+                conn.execute(_SQL_SAVE_CONVERSATION_RECORD, row).lastrowid
+                for row in rows
+            ]
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    return record_ids
 
 
 def get_conversation_history(
@@ -348,6 +458,7 @@ def get_conversation_history(
     sender_id: Optional[str] = None,
     limit: int = 50,
     offset: int = 0,
+    before_id: Optional[int] = None,
 ) -> List[Tuple]:
     """
     获取对话历史记录
@@ -356,13 +467,13 @@ def get_conversation_history(
         conversation_id: 会话ID，可选
         sender_id: 发送者ID，可选
         limit: 返回记录数量限制
-        offset: 偏移量
+        offset: 偏移量（深分页请改用 before_id）
+        before_id: 游标分页，返回排在该记录之后（更早）的记录，
+                   取上一页最后一条记录的ID；走 created_at 索引，不随页数变慢
 
     Returns:
         List[Tuple]: 对话记录列表
     """
-    conn = get_conn()
-
     # 构建查询条件
     where_conditions = []
     params = []
@@ -375,6 +486,12 @@ def get_conversation_history(
         where_conditions.append("sender_id = ?")
         params.append(sender_id)
 
+    if before_id is not None:
+        where_conditions.append(
+            "(created_at, id) < (SELECT created_at, id FROM conversation_records WHERE id = ?)"
+        )
+        params.append(before_id)
+
     where_clause = ""
     if where_conditions:
         where_clause = "WHERE " + " AND ".join(where_conditions)
@@ -387,13 +504,12 @@ def get_conversation_history(
                message_type, response_time_ms, agent_type, created_at, updated_at
         FROM conversation_records
         {where_clause}
-        ORDER BY created_at DESC
+        ORDER BY created_at DESC, id DESC
         LIMIT ? OFFSET ?
     """
 
-    cursor = conn.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
+    with _shared_conn() as conn:
+        rows = conn.execute(query, params).fetchall()
     return rows
 
 
@@ -415,8 +531,6 @@ def get_conversation_stats(
     Returns:
         Dict[str, Any]: 统计信息
     """
-    conn = get_conn()
-
     # 构建查询条件
     where_conditions = []
     params = []
@@ -429,71 +543,277 @@ def get_conversation_stats(
         where_conditions.append("sender_id = ?")
         params.append(sender_id)
 
+    # 日期条件直接比较 created_at（"YYYY-MM-DD HH:MM:SS" 文本），可以使用 created_at 索引
     if start_date:
-        where_conditions.append("DATE(created_at) >= ?")
+        where_conditions.append("created_at >= ?")
         params.append(start_date)
 
     if end_date:
-        where_conditions.append("DATE(created_at) <= ?")
+        where_conditions.append("created_at < date(?, '+1 day')")
         params.append(end_date)
 
     where_clause = ""
     if where_conditions:
         where_clause = "WHERE " + " AND ".join(where_conditions)
 
-    # 获取基本统计信息
+    # 一次查询同时得到总体统计、智能体类型分布和消息类型分布：
+    # 过滤结果只计算一次（CTE 被多次引用时 SQLite 会物化），
+    # 分布直接由 json_group_array 在 SQLite 内聚合成 JSON，Python 侧只需一次解析
     stats_query = f"""
+        WITH filtered AS (
+            SELECT sender_id, conversation_id, response_time_ms, agent_type, message_type, created_at
+            FROM conversation_records
+            {where_clause}
+        )
         SELECT
-            COUNT(*) as total_conversations,
-            COUNT(DISTINCT sender_id) as unique_users,
-            COUNT(DISTINCT conversation_id) as unique_conversations,
-            AVG(response_time_ms) as avg_response_time_ms,
-            MIN(created_at) as first_conversation,
-            MAX(created_at) as last_conversation
-        FROM conversation_records
-        {where_clause}
+            COUNT(*),
+            COUNT(DISTINCT sender_id),
+            COUNT(DISTINCT conversation_id),
+            AVG(response_time_ms),
+            MIN(created_at),
+            MAX(created_at),
+            (
+                SELECT json_group_array(json_object('agent_type', agent_type, 'count', count))
+                FROM (
+                    SELECT agent_type, COUNT(*) AS count
+                    FROM filtered
+                    GROUP BY agent_type
+                    ORDER BY count DESC
+                )
+            ),
+            (
+                SELECT json_group_array(json_object('message_type', message_type, 'count', count))
+                FROM (
+                    SELECT message_type, COUNT(*) AS count
+                    FROM filtered
+                    GROUP BY message_type
+                    ORDER BY count DESC
+                )
+            )
+        FROM filtered
     """
 
-    cursor = conn.execute(stats_query, params)
-    stats = cursor.fetchone()
+    with _shared_conn() as conn:
+        stats = conn.execute(stats_query, params).fetchone()
 
-    # 获取智能体类型分布
-    agent_stats_query = f"""
-        SELECT agent_type, COUNT(*) as count
-        FROM conversation_records
-        {where_clause}
-        GROUP BY agent_type
-        ORDER BY count DESC
+    return {
+        "total_conversations": stats[0],
+        "unique_users": stats[1],
+        "unique_conversations": stats[2],
+        "avg_response_time_ms": stats[3],
+        "first_conversation": stats[4],
+        "last_conversation": stats[5],
+        "agent_distribution": json.loads(stats[6]),
+        "message_type_distribution": json.loads(stats[7]),
+    }
+
+
+def count_conversation_records_before(cutoff_date: str) -> int:
+    """统计 cutoff_date（YYYY-MM-DD）之前的对话记录数量"""
+    with _shared_conn() as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM conversation_records WHERE created_at < ?", (cutoff_date,)
+        ).fetchone()[0]
+
+
+def delete_conversation_records_before(cutoff_date: str) -> int:
+    """删除 cutoff_date（YYYY-MM-DD）之前的对话记录，返回删除条数"""
+    with _shared_conn() as conn:
+        return conn.execute(
+            "DELETE FROM conversation_records WHERE created_at < ?", (cutoff_date,)
+        ).rowcount
+
+
+def export_conversation_records(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    conversation_id: Optional[str] = None,
+    sender_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
     """
+    按条件导出对话记录（按时间倒序）
 
-    cursor = conn.execute(agent_stats_query, params)
-    agent_distribution = cursor.fetchall()
+    Args:
+        start_date: 开始日期（含），格式：YYYY-MM-DD
+        end_date: 结束日期（含），格式：YYYY-MM-DD
+        conversation_id: 会话ID，可选
+        sender_id: 发送者ID，可选
 
-    # 获取消息类型分布
-    message_type_query = f"""
-        SELECT message_type, COUNT(*) as count
-        FROM conversation_records
-        {where_clause}
-        GROUP BY message_type
-        ORDER BY count DESC
+    Returns:
+        List[Dict[str, Any]]: 以列名为键的记录列表
     """
+    query = "SELECT * FROM conversation_records WHERE 1=1"
+    params: List[Any] = []
 
-    cursor = conn.execute(message_type_query, params)
-    message_type_distribution = cursor.fetchall()
+    # 与 get_conversation_stats 一致，直接比较 created_at 文本以使用索引
+    if start_date:
+        query += " AND created_at >= ?"
+        params.append(start_date)
+    if end_date:
+        query += " AND created_at < date(?, '+1 day')"
+        params.append(end_date)
+    if conversation_id:
+        query += " AND conversation_id = ?"
+        params.append(conversation_id)
+    if sender_id:
+        query += " AND sender_id = ?"
+        params.append(sender_id)
+    query += " ORDER BY created_at DESC"
 
-    conn.close()
+    with _shared_conn() as conn:
+        cursor = conn.execute(query, params)
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, record)) for record in cursor.fetchall()]
 
-    return {
-        "total_conversations": stats[0] if stats else 0,
-        "unique_users": stats[1] if stats else 0,
-        "unique_conversations": stats[2] if stats else 0,
-        "avg_response_time_ms": stats[3] if stats else None,
-        "first_conversation": stats[4] if stats else None,
-        "last_conversation": stats[5] if stats else None,
-        "agent_distribution": [
-            {"agent_type": row[0], "count": row[1]} for row in agent_distribution
-        ],
-        "message_type_distribution": [
-            {"message_type": row[0], "count": row[1]} for row in message_type_distribution
-        ],
-    }
+
+def ping_db() -> None:
+    """检查数据库是否可用，失败时抛出 sqlite3.Error"""
+    with _shared_conn() as conn:
+        conn.execute("SELECT 1").fetchone()
+
+
+# ========== 异步封装：在线程中执行同步 SQLite 操作，避免阻塞事件循环 ==========
+
+
+class _WriteBatcher:
+    """
+    对话记录批量写入器
+
+    并发到达的写入请求进入队列，后台协程一次取出当前排队的全部记录，
+    在线程中用同一个事务提交，高并发时把多次提交合并为一次。
+    """
+
+    def __init__(self, max_batch: int = 100):
+        self._max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, row: Tuple) -> int:
+        """提交一条记录，等待所在批次提交后返回记录ID"""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run(self._queue), name="db:write-batcher")
+        future = loop.create_future()
+        self._queue.put_nowait((row, future))
+        return await future
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        closing = False
+        while not closing:
+            item = await queue.get()
+            # None 为 close() 放入的结束标记，之前排队的记录都已处理
+            if item is None:
+                return
+            batch = [item]
+            # 不额外等待，只合并已经在排队的请求，避免增加单条写入的延迟
+            while len(batch) < self._max_batch and not queue.empty():
+                item = queue.get_nowait()
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+
+            try:
+                record_ids = await run_blocking(
+                    _insert_conversation_records, [row for row, _ in batch]
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            except BaseException:
+                # 被取消时也要结束本批次的等待，否则调用方会一直挂起
+                for _, future in batch:
+                    future.cancel()
+                raise
+            else:
+                for (_, future), record_id in zip(batch, record_ids):
+                    if not future.done():
+                        future.set_result(record_id)
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """应用关闭时调用：等待已排队的记录写入后结束后台协程，超时则取消，未写入的请求一并取消"""
+        task, queue = self._task, self._queue
+        self._task = self._queue = None
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            return
+        queue.put_nowait(None)
+        try:
+            await asyncio.wait_for(task, timeout)
+        except TimeoutError:
+            pass
+        finally:
+            while not queue.empty():
+                item = queue.get_nowait()
+                if item is not None:
+                    item[1].cancel()
+
+
+_conversation_writer = _WriteBatcher()
+
+
+async def aclose_conversation_writer() -> None:
+    """写入排队中的对话记录并停止批量写入协程（应用退出时、关闭共享连接前调用）"""
+    await _conversation_writer.close()
+
+
+async def asave_conversation_record(
+    conversation_id: str,
+    sender_id: str,
+    user_question: str,
+    ai_response: str,
+    message_type: str = "text",
+    response_time_ms: Optional[int] = None,
+    agent_type: Optional[str] = None,
+) -> int:
+    """save_conversation_record 的异步版本，并发写入会合并到同一事务提交"""
+    beijing_time = get_beijing_time_str()
+    return await _conversation_writer.submit(
+        (
+            conversation_id,
+            sender_id,
+            user_question,
+            ai_response,
+            message_type,
+            response_time_ms,
+            agent_type,
+            beijing_time,
+            beijing_time,
+        )
+    )
+
+
+async def aget_conversation_history(*args, **kwargs) -> List[Tuple]:
+    """get_conversation_history 的异步版本"""
+    return await run_blocking(get_conversation_history, *args, **kwargs)
+
+
+async def aget_conversation_stats(*args, **kwargs) -> Dict[str, Any]:
+    """get_conversation_stats 的异步版本"""
+    return await run_blocking(get_conversation_stats, *args, **kwargs)
+
+
+async def aget_first_user_id() -> Optional[str]:
+    """get_first_user_id 的异步版本"""
+    return await run_blocking(get_first_user_id)
+
+
+async def asave_weekly_log(*args, **kwargs) -> int:
+    """save_weekly_log 的异步版本"""
+    return await run_blocking(save_weekly_log, *args, **kwargs)
+
+
+async def aget_weekly_logs_by_date_range(*args, **kwargs) -> list:
+    """get_weekly_logs_by_date_range 的异步版本"""
+    return await run_blocking(get_weekly_logs_by_date_range, *args, **kwargs)
+
+
+async def aget_jira_account(user_id: str) -> Optional[Tuple[str, str]]:
+    """get_jira_account 的异步版本"""
+    return await run_blocking(get_jira_account, user_id)
+
+
+async def asave_jira_account(user_id: str, username: str, password: str) -> None:
+    """save_jira_account 的异步版本"""
+    await run_blocking(save_jira_account, user_id, username, password)
@@ -6,164 +6,184 @@
 """
 
 import asyncio
+import os
+import sys
 from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager, suppress
+from typing import Optional
 
+import anyio.to_thread
 import uvicorn
-from dotenv import load_dotenv
 from fastapi import FastAPI
+from loguru import logger
 
 from app.core.config import settings
-from app.core.dingtalk_client import DingTalkClient
 from app.core.logger import setup_logging
-from app.core.scheduler import start_scheduler
-from app.services.knowledge.retriever import KnowledgeRetriever
-
-# 加载环境变量
-load_dotenv()
 
 # 初始化日志系统
 setup_logging()
 
-# 创建线程池（Windows 优化）
-import platform
-import signal
-
-# 检测操作系统
-is_windows = platform.system() == "Windows"
-
-if is_windows:
-    # Windows 下使用更小的线程池，便于管理
-    thread_pool = ThreadPoolExecutor(max_workers=2)
-else:
-    # Mac/Linux 使用标准配置
-    thread_pool = ThreadPoolExecutor(max_workers=5)
+# 检测操作系统（模块加载时计算一次）
+IS_WINDOWS = sys.platform.startswith("win")
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
+def _configure_default_executor() -> ThreadPoolExecutor:
     """
-    应用生命周期管理 - 依赖注入架构 + Windows 热重载优化
+    按配置创建线程池并设为事件循环默认执行器，
+    asyncio.to_thread / run_in_executor(None) 与 FastAPI 同步依赖使用相同的并发上限
     """
-    # 启动时执行
-    from loguru import logger
-    logger.info("🚀 启动钉钉机器人服务")
+    pool_size = settings.THREAD_POOL_SIZE or min(32, (os.cpu_count() or 1) * 2 + 4)
+    io_pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="dt-io")
+    asyncio.get_running_loop().set_default_executor(io_pool)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = pool_size
+    return io_pool
+
 
-    dingtalk_client = None
-    scheduler_task = None
-    dingtalk_future = None
+@asynccontextmanager
+async def container_lifespan(app: FastAPI):
+    """依赖注入容器生命周期：初始化容器，退出时清理"""
+    from app.core.container import cleanup_container, container, initialize_container
+    from app.db_utils import init_db
+
+    # 容器初始化（知识库、向量内存）与 SQLite 建表互不依赖，并发执行缩短冷启动时间
+    async with asyncio.TaskGroup() as tg:
+        init_task = tg.create_task(initialize_container())
+        tg.create_task(asyncio.to_thread(init_db))
+    success = init_task.result()
+    if not success:
+        logger.error("❌ 依赖注入容器初始化失败，服务启动中止")
+        raise RuntimeError("依赖注入容器初始化失败")
+
+    # 启动时解析一次知识库检索器并缓存到 app.state，请求处理和钉钉客户端直接复用
+    app.state.knowledge_retriever = container.knowledge_retriever()
 
     try:
-        # 初始化依赖注入容器
-        from app.core.container import initialize_container, container
-        success = await initialize_container()
-        if not success:
-            logger.error("❌ 依赖注入容器初始化失败，服务启动中止")
-            raise RuntimeError("依赖注入容器初始化失败")
+        yield
+    finally:
+        logger.info("🧹 清理依赖注入容器...")
+        app.state.knowledge_retriever = None
+        try:
+            await cleanup_container()
+            logger.info("✅ 依赖注入容器清理完成")
+        except Exception as e:
+            logger.warning(f"⚠️ 容器清理时出现异常: {e}")
 
-        # 获取知识库检索器实例
-        knowledge_retriever = container.knowledge_retriever()
 
-        # 启动钉钉客户端（使用依赖注入架构）
-        logger.info("🔗 启动钉钉客户端")
-        dingtalk_client = DingTalkClient(knowledge_retriever=knowledge_retriever)
-        loop = asyncio.get_event_loop()
-        # 正确调用钉钉客户端的start_forever方法
-        dingtalk_future = loop.run_in_executor(thread_pool, dingtalk_client.stream_client.start_forever)
+# 关闭阶段等待钉钉客户端和定时任务退出的总时长上限（秒）
+SHUTDOWN_TIMEOUT = 10.0
 
-        # 启动定时任务
-        logger.info("⏰ 启动定时任务")
-        scheduler_task = asyncio.create_task(start_scheduler())
 
-        logger.info("✅ 所有服务启动完成")
-        logger.info(f"🖥️ 运行平台: {platform.system()} - Windows优化: {is_windows}")
-        logger.info("🏗️ 使用依赖注入架构")
+def start_dingtalk_client(app: FastAPI):
+    """启动钉钉客户端：在独立子进程中运行 Stream 连接"""
+    from app.core.dingtalk_client import DingTalkClient
 
+    logger.info("🔗 启动钉钉客户端")
+    dingtalk_client = DingTalkClient(knowledge_retriever=app.state.knowledge_retriever)
+    # Stream 长连接的收发放在 spawn 子进程中，不与主进程的请求处理争用 GIL；
+    # 消息经进程队列回传，AI 处理与回复仍在主进程事件循环中完成
+    dingtalk_client.start_stream_process()
+    return dingtalk_client
 
 
+async def stop_dingtalk_client(dingtalk_client) -> None:
+    """停止钉钉 Stream 子进程和消息消费协程"""
+    logger.info("🛑 停止钉钉客户端...")
+    try:
+        await asyncio.to_thread(dingtalk_client.stop_stream_process)
+        await dingtalk_client.stop_event_workers()
+        logger.info("✅ 钉钉客户端已停止")
     except Exception as e:
-        logger.error(f"❌ 应用启动失败: {e}")
-        raise
+        logger.warning(f"⚠️ 钉钉客户端停止时出现异常: {e}")
 
 
-    yield
+def start_scheduler_task() -> asyncio.Task:
+    """启动定时任务调度器"""
+    from app.core.scheduler import start_scheduler
 
-    # 关闭时执行 - 依赖注入架构 + Windows 优化
-    logger.info("🔄 开始关闭钉钉机器人服务")
+    logger.info("⏰ 启动定时任务")
+    return asyncio.create_task(start_scheduler(), name="scheduler")
 
-    # 1. 首先停止定时任务
-    if scheduler_task and not scheduler_task.done():
-        logger.info("🛑 停止定时任务...")
-        scheduler_task.cancel()
-        with suppress(asyncio.CancelledError):
-            await scheduler_task
-        logger.info("✅ 定时任务已停止")
 
-    # 2. 停止钉钉客户端 - Windows 优化
-    if dingtalk_client:
-        logger.info("🛑 停止钉钉客户端...")
-        try:
-            # 首先取消future任务
-            if dingtalk_future and not dingtalk_future.done():
-                logger.info("取消钉钉客户端future任务...")
-                dingtalk_future.cancel()
+async def stop_scheduler_task(scheduler_task: asyncio.Task) -> None:
+    """取消调度并等待已派发的任务结束"""
+    from app.core.scheduler import drain_background_tasks
 
-            # 然后停止客户端
-            dingtalk_client.stop()
+    logger.info("🛑 停止定时任务...")
+    scheduler_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await scheduler_task
+    await drain_background_tasks()
+    logger.info("✅ 定时任务已停止")
 
-            # 给一点时间让连接正常关闭
-            await asyncio.sleep(0.1)
 
-            logger.info("✅ 钉钉客户端已停止")
-        except Exception as e:
-            logger.warning(f"⚠️ 钉钉客户端停止时出现异常: {e}")
+class AppLifespan:
+    """
+    应用生命周期管理：先初始化容器，再启动钉钉客户端和定时任务，退出时按相反顺序关闭
 
-    # 3. 清理依赖注入容器
-    logger.info("🧹 清理依赖注入容器...")
-    try:
-        from app.core.container import cleanup_container
-        await cleanup_container()
-        logger.info("✅ 依赖注入容器清理完成")
-    except Exception as e:
-        logger.warning(f"⚠️ 容器清理时出现异常: {e}")
+    运行期句柄保存在实例属性中（__slots__ 固定），便于排查关闭阶段的资源泄漏
+    """
 
-    # 4. Windows 特定的线程池关闭
-    logger.info("🛑 关闭线程池...")
-    try:
-        if is_windows:
-            # Windows 下使用更激进的关闭方式
-            import os
-            import threading
-
-            # 强制关闭线程池，不等待任何任务
-            thread_pool.shutdown(wait=False)
-
-            # 给一点时间让线程自然结束
-            await asyncio.sleep(0.1)
-
-            # 检查活跃线程
-            active_threads = threading.active_count()
-            if active_threads > 1:
-                logger.warning(f"Windows: 仍有 {active_threads} 个活跃线程，强制退出进程")
-                # 在 Windows 下，如果线程无法正常关闭，强制退出
-                # 这样 uvicorn 可以重启新进程
-                os._exit(0)
-            else:
-                logger.info("✅ 线程池已关闭")
-        else:
-            # Mac/Linux 使用标准方式
-            thread_pool.shutdown(wait=False)
-            logger.info("✅ 线程池已关闭")
+    __slots__ = ("io_pool", "dingtalk_client", "scheduler_task")
 
-    except Exception as e:
-        logger.warning(f"⚠️ 线程池关闭时出现异常: {e}")
-        # 即使出现异常，也要强制关闭线程池
-        thread_pool.shutdown(wait=False)
+    def __init__(self):
+        self.io_pool: Optional[ThreadPoolExecutor] = None
+        self.dingtalk_client = None
+        self.scheduler_task: Optional[asyncio.Task] = None
 
-    # 5. 短暂等待，让资源有时间释放
-    await asyncio.sleep(0.2)
+    @asynccontextmanager
+    async def __call__(self, app: FastAPI):
+        logger.info("🚀 启动钉钉机器人服务")
+        self.io_pool = _configure_default_executor()
 
-    logger.info("🎉 钉钉机器人服务关闭完成")
+        try:
+            async with container_lifespan(app), self._services(app):
+                logger.info("✅ 所有服务启动完成")
+                logger.info(f"🖥️ 运行平台: {sys.platform} - Windows优化: {IS_WINDOWS}")
+                logger.info("🏗️ 使用依赖注入架构")
+                yield
+                logger.info("🔄 开始关闭钉钉机器人服务")
+        except Exception as e:
+            logger.error(f"❌ 应用运行失败: {e}")
+            raise
+        finally:
+            # 关闭模型客户端共享的 HTTP 连接池
+            from app.services.ai.client.openai_client import close_model_clients
+            await close_model_clients()
+
+            # 写入排队中的对话记录后关闭数据库共享连接
+            from app.db_utils import aclose_conversation_writer, close_shared_conn
+            await aclose_conversation_writer()
+            close_shared_conn()
+
+            # 关闭默认线程池，不再等待排队中的任务
+            self.io_pool.shutdown(wait=False, cancel_futures=True)
+            self.io_pool = None
+
+        logger.info("🎉 钉钉机器人服务关闭完成")
+
+    @asynccontextmanager
+    async def _services(self, app: FastAPI):
+        """钉钉客户端与定时任务：两者的关闭互不依赖，退出时并发执行并限制总等待时长"""
+        self.dingtalk_client = start_dingtalk_client(app)
+        self.scheduler_task = start_scheduler_task()
+
+        try:
+            yield
+        finally:
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(
+                        stop_dingtalk_client(self.dingtalk_client),
+                        stop_scheduler_task(self.scheduler_task),
+                        return_exceptions=True,
+                    ),
+                    timeout=SHUTDOWN_TIMEOUT,
+                )
+            except TimeoutError:
+                logger.warning(f"⚠️ 钉钉客户端与定时任务未在 {SHUTDOWN_TIMEOUT} 秒内全部停止")
+            finally:
+                self.dingtalk_client = None
+                self.scheduler_task = None
 
 
 # 创建FastAPI应用
@@ -171,13 +191,13 @@ app = FastAPI(
     title="钉钉AI机器人",
     description="集成AI问答、知识库检索、JIRA管理和服务器维护功能的钉钉机器人",
     version="0.1.0",
-    lifespan=lifespan,
+    lifespan=AppLifespan(),
     docs_url="/docs",       # Swagger UI 文档
     redoc_url="/redoc",     # ReDoc 文档
     openapi_url="/openapi.json",
 )
-
-
+# 预先设置为 None，容器初始化完成前及关闭后直接按 None 判断，无需 hasattr/getattr 兜底
+app.state.knowledge_retriever = None
 
 # 设置中间件
 from app.core.middleware import setup_middleware
@@ -185,7 +205,9 @@ setup_middleware(app)
 
 # 导入路由
 from app.api.router import api_router
-app.include_router(api_router)
+# api_router 本身无前缀、依赖和标签，子路由在其中注册时已完成前缀拼接，
+# 直接复用已构建好的路由对象，避免 include_router 逐条重新构建 APIRoute
+app.router.routes.extend(api_router.routes)
 
 
 @app.get("/")
@@ -200,6 +222,7 @@ if __name__ == "__main__":
     """
     直接运行此文件时执行的入口
     """
+    # uvicorn 默认 loop="auto"，已安装 uvloop（随 uvicorn[standard] 安装）时自动使用
     uvicorn.run(
         "app.main:app",
         host=settings.API_HOST,
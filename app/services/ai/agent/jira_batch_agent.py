@@ -1,21 +1,21 @@
 import json
-import os
 import re
 import asyncio
-from typing import List, Dict, Any, Optional, TypedDict
+from contextlib import aclosing, suppress
+from typing import List, Dict, Any, Optional, Tuple, TypedDict
 from loguru import logger
+import orjson
 
 from autogen_core import CancellationToken
+from autogen_core.models import SystemMessage, UserMessage
 from autogen_agentchat.agents import AssistantAgent
-from autogen_agentchat.messages import TextMessage
-from autogen_agentchat.base import Response, TaskResult
-from autogen_agentchat.conditions import TextMentionTermination, ExternalTermination
-from autogen_agentchat.teams import RoundRobinGroupChat
-from autogen_agentchat.ui import Console
+from autogen_agentchat.messages import ModelClientStreamingChunkEvent, TextMessage
+from autogen_agentchat.base import Response
 
-from app.db_utils import get_jira_account, save_jira_account
+from app.core.config import settings
+from app.db_utils import aget_jira_account, asave_jira_account, get_jira_account, save_jira_account
 from app.services.ai.tools.jira_bulk_creator import JiraTicketCreator
-from app.services.ai.client.openai_client import get_openai_client
+from app.services.ai.client.openai_client import get_json_openai_client, get_openai_client
 
 
 # ---- TypedDict for input payload ---- #
@@ -26,37 +26,141 @@ class JiraInput(TypedDict):
     conversation_id: str
 
 
+# 账号信息正则与关键词，模块加载时预编译/构造一次
+_JIRA_ACCOUNT_RE = re.compile(r"用户名[:：]\s*(\S+)\s*密码[:：]\s*(\S+)")
+_JIRA_TICKET_KEYWORDS = ("创建jira", "jira单子", "提单", "工单", "bug", "需求", "任务")
+_ACCOUNT_HINT_KEYWORDS = ("用户名", "密码", "账号", "登录", "username", "password")
+
+
+# 系统提示词作为模块常量，每次请求发送的系统消息前缀完全一致，便于服务端前缀缓存命中
+# 需求分析提示词：把用户描述整理成结构化提单
+_ANALYST_SYSTEM_MESSAGE = """你是需求分析师，把用户描述中的一个或多个需求整理成研发提单，纯文本输出（不含XML标签）。
+
+规则：
+- 逐一识别所有需求；未提及客户时客户为"新视窗"。
+- 明显区分前后端（含"前端/后端"字样、页面交互 vs 接口数据处理、分段序号）时拆成前端、后端两个结构块。
+- 项目/模块未给出时按内容推断，优先"数据中台"、"APP"、"官网"等常见名称。
+- 标题简洁且彼此明显不同；功能点逐条简述；实现路径写清步骤，包含用户给出的参考链接和前置要求（如"1. 确保已完成API接口对接。"）。
+- 每个结构块后单独一行 --- 分隔，中文、专业、准确。
+
+模板：
+【客户名称】【项目/模块名称】需求标题 - 前端|后端（仅拆分时添加）
+【功能描述】:
+- 功能点1
+- 功能点2
+【实现路径】：
+1. 步骤1
+2. 步骤2
+---
+
+示例：
+【新视窗】【APP】社交分享功能 - 前端
+【功能描述】:
+- 详情页新增分享按钮，支持微信、朋友圈
+【实现路径】：
+1. 接入微信分享SDK
+2. 详情页添加分享入口及回调提示
+---
+"""
+
+# JSON修复提示词：仅在本地解析参数提取结果失败时使用
+_VALIDATOR_SYSTEM_MESSAGE = """你是JSON修复专家。收到的内容本应是 {"jiraList": [{"title", "customerName", "description"}]} 结构的JSON，但本地解析失败。
+请修复后以"FIXED_JSON"开头输出修复后的JSON，不要附加任何解释；如果内容本身已是合法JSON，仅回复"VALID_JSON"。
+"""
+
+# 参数提取提示词：把单个或多个提单块转为 jiraList
+_EXTRACTOR_SYSTEM_MESSAGE = """你是结构化数据提取专家，把需求分析师输出的提单文本转为JSON：{"jiraList": [{"title", "customerName", "description"}]}，字段均必填。
+
+- 每个工单以 --- 分隔；title 为分隔后首行（以【开头的完整标题行）。
+- description 为【功能描述】和【实现路径】两部分原文，保留换行，直到下一个 --- 或文本结束。
+- customerName 为精炼的客户名，去掉地区和性质描述，如：江西乐奥、乐奥物业、乐奥集团 => 乐奥。
+- 原文中的链接（含 Markdown [文本](链接)）须完整保留在 description 中；无法解析的富文本以 <LINK: 原始内容> 或 <RICH_TEXT: 原始语法> 标记。
+- 内容与原文完全一致，不遗漏、不总结、不发挥；只输出JSON。
+"""
+
+# 需求分析结果中工单块之间的分隔行
+_TICKET_SEPARATOR_RE = re.compile(r"^\s*-{3,}\s*$", re.MULTILINE)
+
+_JSON_FENCE_RE = re.compile(r"```json\s*([\s\S]*?)\s*```")
+_JSON_START_RE = re.compile(r"[\[{]")
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _scan_json_value(text: str) -> Any:
+    """
+    从左到右单遍扫描文本，返回第一个包含 jiraList 的 JSON 对象或第一个 JSON 数组
+
+    每个候选起点用 raw_decode 解析出完整的值，成功后直接跳到该值末尾继续扫描，
+    不会像首个 "[" 到最后一个 "]" 的截取那样误把字符串内容里的括号当作边界。
+    """
+    # 常见情况：整段文本就是 JSON，直接用 orjson 解析
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        pass
+
+    pos = 0
+    while True:
+        match = _JSON_START_RE.search(text, pos)
+        if match is None:
+            return None
+        try:
+            value, end = _JSON_DECODER.raw_decode(text, match.start())
+        except json.JSONDecodeError:
+            pos = match.start() + 1
+            continue
+        if isinstance(value, list) or (isinstance(value, dict) and "jiraList" in value):
+            return value
+        pos = end
+
+
+async def _cancel_task(task: asyncio.Task) -> None:
+    """取消后台任务并等待其结束"""
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
+
+async def _await_alongside(awaitable, task: asyncio.Task):
+    """等待 awaitable；期间出现异常或被取消时一并取消并发运行的 task，避免其成为孤儿任务继续调用模型"""
+    try:
+        return await awaitable
+    except BaseException:
+        await _cancel_task(task)
+        raise
+
+
 class JiraAccountAgent:
-    JIRA_ACCOUNT_REGEX = r"用户名[:：]\s*(\S+)\s*密码[:：]\s*(\S+)"
+    JIRA_ACCOUNT_REGEX = _JIRA_ACCOUNT_RE.pattern
 
     def __init__(self):
         pass
 
     async def extract_and_save_account(self, user_id: str, text: str) -> str:
-        user_info = get_jira_account(user_id)
+        user_info = await aget_jira_account(user_id)
         if user_info:
             return None  # 已有账号，直接返回None代表无需处理
         
         # 首先尝试正则表达式匹配
-        match = re.search(self.JIRA_ACCOUNT_REGEX, text)
+        match = _JIRA_ACCOUNT_RE.search(text)
         if match:
             username, password = match.groups()
-            save_jira_account(user_id, username, password)
+            await asave_jira_account(user_id, username, password)
             return "账号保存成功，请重新输入提单内容。"
         
         # 检查是否是明显的JIRA工单创建请求，如果是则直接返回配置提示
-        jira_keywords = ["创建jira", "jira单子", "提单", "工单", "bug", "需求", "任务"]
-        if any(keyword in text.lower() for keyword in jira_keywords):
+        lowered = text.lower()
+        if any(keyword in lowered for keyword in _JIRA_TICKET_KEYWORDS):
             logger.info(f"用户 {user_id} 输入包含JIRA关键词但未配置账号，直接返回配置提示")
             return "请先配置你的**JIRA账号信息**（格式如下）：\n**用户名**: `your_jira_username`\n**密码**: `your_jira_password`\n\n配置完成后，请重新输入提单内容。"
         
         # 只有当输入可能包含账号信息时才调用智能体
-        if any(keyword in text for keyword in ["用户名", "密码", "账号", "登录", "username", "password"]):
+        if any(keyword in lowered for keyword in _ACCOUNT_HINT_KEYWORDS):
             try:
                 creds = await self.handle_agent_params(text)
                 if creds and isinstance(creds, dict) and "username" in creds and "password" in creds:
                     username, password = creds["username"], creds["password"]
-                    save_jira_account(user_id, username, password)
+                    await asave_jira_account(user_id, username, password)
                     return "账号保存成功，请重新输入提单内容。"
             except Exception as e:
                 logger.error(f"处理账号参数时发生错误: {e}")
@@ -72,27 +176,13 @@ class JiraAccountAgent:
             "password": "jira_password"
         }
         """
-        model_client = get_openai_client(temperature=0)
+        # JSON 模式：模型只会输出合法的 JSON 对象，提示词无需再用示例约束格式
+        model_client = get_json_openai_client(temperature=0)
 
         params_agent = AssistantAgent(
             name="parameter_extractor_account",
             model_client=model_client,
-            system_message="""你是一位专业的参数提取专家，用户的输入中可能包含
-                1. JIRA账号信息 - 用户名
-                2. JIRA密码 - 用户密码
-            请提取出上述信息，并以JSON格式返回，如果没有对应的账号密码信息，请提示用户重新输入。
-
-            提取失败的格式如下：
-            请输入你的**JIRA账号信息**（格式如下）：
-            **用户名**: `your_jira_username`
-            **密码**: `your_jira_password`
-
-            提取成功输出json格式为：
-            {
-                "username": "xxx",
-                "password": "xxx"
-            }
-            """,
+            system_message='从用户输入中提取 JIRA 账号，输出 JSON：{"username": "...", "password": "..."}；没有账号信息时输出 {}。',
         )
 
         messages = [TextMessage(content=text, source="user")]
@@ -114,22 +204,9 @@ class JiraAccountAgent:
                 logger.warning(f"Last message content is not a string: {content_str}")
                 return None
             
-            # 先尝试直接解析JSON
+            # JSON 模式下输出即为合法 JSON
             try:
-                return json.loads(content_str)
-            except json.JSONDecodeError:
-                # 如果JSON解析失败，尝试从文本中提取JSON块
-                json_pattern = r'\{[^{}]*"username"[^{}]*"password"[^{}]*\}'
-                json_match = re.search(json_pattern, content_str)
-                if json_match:
-                    try:
-                        return json.loads(json_match.group())
-                    except json.JSONDecodeError:
-                        logger.warning(f"Failed to parse extracted JSON: {json_match.group()}")
-                
-                # 如果仍然解析失败，记录警告并返回None
-                logger.warning(f"Error decoding JSON from text: {content_str[:200]}...")
-                return None
+                return orjson.loads(content_str)
             except Exception as e: # pragma: no cover
                 logger.error(f"An unexpected error occurred during JSON extraction: {e}")
                 return None
@@ -139,144 +216,82 @@ class JiraAccountAgent:
 
 
 class JiraBatchAgent:
+    _instance: "JiraBatchAgent | None" = None  # 单例缓存
+
+    def __new__(cls, *args, **kwargs):  # noqa: D401
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
     def __init__(self):
+        if getattr(self, "_initialized", False):
+            return
+        self._initialized = True
         # 初始化大语言模型客户端
         self.model_client = get_openai_client()
         # 封装账号提取智能体
         self.account_agent = JiraAccountAgent()
 
-        # 创建需求分析智能体 - 负责将需求转化为结构化的提单
-        self.ticket_clarification_agent = AssistantAgent(
-            name="requirements_analyst",
-            model_client=self.model_client,
-            system_message="""你是一位专业的需求分析师，负责将用户提出的需求转化为规范的研发提单。用户会提供一段描述，其中可能包含一个或多个需求。你需要将这些需求提取出来，并按照固定的模板进行结构化输出。
-
-**处理流程：**
-
-1.  **需求分析:** 仔细阅读用户输入，识别出所有的功能需求。注意，用户输入可能包含多个需求，需要逐一识别。如果无法提取到客户信息，默认客户为"新视窗"。
-2.  **需求拆分:** 将每个需求拆分为独立的结构块。如果一个需求明显可以区分前端和后端工作，则将其拆分为两个结构块，分别对应前端和后端。拆分依据包括但不限于：
-    * 明显的"前端"、"后端"字样。
-    * 功能描述中涉及页面、交互（通常为前端）或接口、数据处理（通常为后端）。
-    * 语句有明显的、语义分段、序号标记。
-3.  **结构化输出:** 对于每个需求（或拆分后的前端/后端需求），按照以下模板生成提单内容：
-
-    ```
-    【客户名称】【项目/模块名称】需求标题 - <前端 | 后端> (如果需要拆分前后端，则添加此标签)
-    【功能描述】:
-    - 功能点1描述
-    - 功能点2描述 (如果有多个功能点，逐条列出)
-    【实现路径】：
-    1. 实现步骤1 (参考文档链接如果有的话)
-    2. 实现步骤2
-    ... (根据需要添加更多步骤)
-    ---
-    ```
-    * **客户名称:** 从用户输入中提取，如果未提供，则默认为"新视窗"。
-    * **项目/模块名称:** 从用户输入中提取，例如"数据中台"、"APP"等。如果没有明确给出，可以根据需求内容推断一个合适的名称。推断时，优先使用常见的项目或模块名称，如"数据中台"、"APP"、"官网"等。
-    * **需求标题:** 简洁概括需求内容。
-    * **前端/后端:** 如果需求被拆分为前端和后端，则在此处添加相应的标签。
-    * **功能描述:** 详细描述需求的功能点，使用短横线 (-) 分隔每个功能点。每个功能点应简洁明了，不宜过长。
-    * **实现路径:** 列出实现该需求的具体步骤。如果用户提供了参考文档链接，将其包含在实现路径中。如果用户有具体前置内容要求，需要添加对应模版的<实现路径>中，例如："1. 确保已完成API接口对接。" 实现路径应包含足够的细节，以便研发人员理解，但避免过度冗余。
-4.  **多需求处理:** 如果用户输入包含多个需求，重复步骤2和3，为每个需求生成一个独立的结构块。每个结构块之间用下划线 "---" 分隔，并确保有明确的换行。
-5.  **检查与优化:** 确保每个需求都包含标题、功能点描述和实现路径。检查语言是否流畅、专业，并符合研发体系的要求。
-
-**注意事项：**
-
-* 严格遵守中文语境。
-* 确保提单内容的专业性和准确性。
-* 尽量保证标题都不相似，要看上去有明显的差异
-* 输出纯文本内容，不包含任何XML标签。
-* 每个需求结构块要有明确的换行、并且输出下划线标记进行分割。
-""",
-        )
+        # 参数提取直接调用 JSON 模式的模型客户端：无状态，多个工单块可以并发提取
+        self.parameter_extractor_client = get_json_openai_client()
+
+    # AssistantAgent 会保留对话上下文，需求分析和JSON修复智能体按请求新建，
+    # 不同用户的批量提单可以并发处理，互不影响
 
-        # 创建参数提取智能体 - 负责从结构化提单中提取JSON参数
-        self.parameter_extractor_agent = AssistantAgent(
-            name="parameter_extractor_tickets", # Renamed for clarity
+    def _new_analyst_agent(self) -> AssistantAgent:
+        """需求分析智能体 - 负责将需求转化为结构化的提单"""
+        return AssistantAgent(
+            name="requirements_analyst",
             model_client=self.model_client,
-            system_message="""你是专业的结构化数据提取专家，负责将需求分析师处理的结构化文本转换为标准JSON格式。
-
-你需要提取文本段落中的参数，包含一个名为 `jiraList` 的数组对象。
-
-1. **提取 `jiraList` 参数** - `array[object]` - **必填** （所有单子的信息）
-   - **对象结构：**
-     - `title`: `string` - 必填。包含客户信息的总标题部分。
-     - `customerName`: `string` - 必填。客户名称
-     - `description`: `string` - 必填。包含【功能描述】和【实现路径】两部分的信息内容，要包含换行符。
-
-2. **富文本识别处理能力：**
-   - 你具有富文本识别处理提取的能力。当原始文本中出现富文本渲染的链接（例如 Markdown 链接 `[文本](链接)` 或其他类似的富文本语法）时，请务必完整地识别并提取到 `description` 属性中。
-   - 如果遇到无法完全解析的富文本语法，请在提取的字符串中使用明确的标记（例如 `<LINK: 原始链接内容>` 或 `<RICH_TEXT: 原始语法>`）来表达其存在，确保没有信息丢失。
-
-### 文本分割规则：
-- 每个独立的数据对象通常由 `---` 分隔。
-- `title` 是紧随分隔符后的第一行内容，通常以 `【` 开头并以 `】` 结尾。
-- `description` 包含 `【功能描述】` 和 `【实现路径】` 两部分的内容，要包含换行符，直到下一个 `---` 分隔符或者文本结束。
-- `customerName`: `string` - 必填。客户名称 （运用自然语言处理技术，准确判断并提取客户名、自动忽略非客户名称的干扰信息、客户名称要尽可能准确、精炼，最好去除地区名称或者性质描述。提取客户名称可以适当的简化，比如：江西乐奥==>乐奥、乐奥物业===》乐奥、乐奥集团==>乐奥）
-
-### 注意和要求规范：
-- **完整性：** 提取的内容必须与接收到的原始文本内容完全保持一致，不能缺失任何信息，也不能自由发挥或进行总结。
-- **精确性：** 严格按照定义的字段和结构输出数据对象。
-- **输出格式：** 仅输出提取到的 JSON 格式数据对象，不包含任何额外的解释或说明。
-- **任务完成标记：** 当你完成JSON提取后，请以"JSON_DONE"结束你的回答，这样我们知道任务已完成。
-""",
+            system_message=_ANALYST_SYSTEM_MESSAGE,
         )
 
-        # 创建一个JSON验证智能体 - 确保输出的JSON是有效的
-        self.json_validator_agent = AssistantAgent(
+    def _new_validator_agent(self) -> AssistantAgent:
+        """JSON修复智能体 - 仅在本地解析参数提取结果失败时调用；流式输出，开头即为 VALID_JSON 时可以提前取消生成"""
+        return AssistantAgent(
             name="json_validator",
             model_client=self.model_client,
-            system_message="""
-你是一位专业的JSON验证专家。你的职责是验证参数提取器生成的JSON是否有效，并确保它符合以下标准：
-
-1. 语法正确，没有JSON解析错误
-2. 包含所有必需的字段：jiraList数组，每个元素都有title、customerName和description
-3. 没有额外的文本、解释或注释
-
-如果JSON有效，请回复"VALID_JSON"，否则请修复JSON并以"FIXED_JSON"开头，然后是修复后的JSON。
-""",
+            model_client_stream=True,
+            system_message=_VALIDATOR_SYSTEM_MESSAGE,
         )
 
-        # 创建Team终止条件 - 当消息中包含"VALID_JSON"时停止
-        self.termination_condition = TextMentionTermination("VALID_JSON")
-
-        # 创建团队 - 使用RoundRobinGroupChat模式
-        self.team = RoundRobinGroupChat(
-            participants=[
-                self.ticket_clarification_agent,
-                self.parameter_extractor_agent,
-                self.json_validator_agent,
-            ],
-            termination_condition=self.termination_condition,
-        )
 
     async def process(self, input: JiraInput) -> str:
         logger.info(f"开始为用户 {input.get('sender_id')} 处理Jira批量代理请求: {input.get('text')[:100]}...")
         text = input.get("text")
         user_id = input.get("sender_id")
 
-        # 1. 账号信息智能体优先处理
-        account_result = await self.account_agent.extract_and_save_account(user_id, text)
-        if account_result:  # 有提示语，说明账号未补全或刚保存成功让用户重试，直接返回提示
-            logger.info(f"用户 {user_id} 账号处理结果: {account_result}")
-            return account_result
-
-        # 2. 账号已齐全，进入提单分析主流程
-        logger.info(f"用户 {user_id} 账号已存在或已处理，开始解析提单内容...")
-        parsed_ticket_data_list = await self.process_message(text)
+        # 1. 文本中不含账号信息时，提单解析与账号查询互不依赖：先并发启动解析，再查询账号
+        parse_task = None
+        if not _JIRA_ACCOUNT_RE.search(text):
+            parse_task = asyncio.create_task(self.process_message(text))
+            user_jira_account = await _await_alongside(aget_jira_account(user_id), parse_task)
+            if not user_jira_account:
+                # 账号未配置，放弃解析结果，交给账号智能体返回配置提示
+                await _cancel_task(parse_task)
+                parse_task = None
+
+        # 2. 账号信息智能体处理（账号未配置或文本中含有账号信息）
+        if parse_task is None:
+            account_result = await self.account_agent.extract_and_save_account(user_id, text)
+            if account_result:  # 有提示语，说明账号未补全或刚保存成功让用户重试，直接返回提示
+                logger.info(f"用户 {user_id} 账号处理结果: {account_result}")
+                return account_result
+            logger.info(f"用户 {user_id} 账号已存在或已处理，开始解析提单内容...")
+            parse_task = asyncio.create_task(self.process_message(text))
+            user_jira_account = await _await_alongside(aget_jira_account(user_id), parse_task)
+
+        # 3. 等待提单解析结果，Jira执行凭据 (用户名和密码) 已从数据库获取
+        parsed_ticket_data_list = await parse_task
 
         if not parsed_ticket_data_list:
             logger.warning(f"用户 {user_id} 的输入未能通过AI解析出任何有效的工单信息。原始输入: {text}")
             return "抱歉，我未能从您的输入中准确解析出需要创建的工单信息。请尝试调整您的描述或检查格式。"
 
-        # 3. 获取Jira执行凭据 (用户名和密码从数据库获取) (variable) user_jira_account: Tuple[str, str] | None
-
-        user_jira_account = get_jira_account(user_id)
-        jira_user, jira_password = user_jira_account
-
-        if not user_jira_account or not jira_user or not jira_password:
+        if not user_jira_account or not all(user_jira_account):
             logger.error(f"用户 {user_id} 在数据库中未找到有效的Jira账号凭据。")
             return "错误：未能获取到您已保存的Jira账号信息，请确认您已正确设置Jira账号。"
+        jira_user, jira_password = user_jira_account
 
         # 4. 设置批量创建所需的固定参数
         assignee = jira_user  # 经办人与Jira用户名一致
@@ -311,27 +326,17 @@ class JiraBatchAgent:
     def _extract_json_from_text(self, text: str) -> Optional[List[Dict[str, Any]]]:
         """尝试从文本中提取JSON数组。"""
         try:
-            # 尝试找到最外层的JSON结构，应该是jiraList的列表
-            # 更健壮的方式可能是查找 "jiraList": [...]
-            # 目前假设相关的JSON列表是找到的第一个顶层列表
-
-            # 处理JSON可能嵌入在其他文本或markdown代码块中的情况
-            match = re.search(r'```json\s*([\s\S]*?)\s*```', text, re.DOTALL)
+            # 处理JSON可能嵌入在其他文本或markdown代码块中的情况：有代码块时只扫描代码块内容
+            match = _JSON_FENCE_RE.search(text)
             if match:
-                json_str = match.group(1).strip()
-            else:
-                # Fallback: find first '[' and last ']'
-                json_start = text.find("[")
-                json_end = text.rfind("]")
-                if json_start != -1 and json_end != -1 and json_start < json_end:
-                    json_str = text[json_start : json_end + 1]
-                else: # pragma: no cover
-                    logger.warning(f"Could not find JSON array structure in text: {text[:200]}...")
-                    return None
+                text = match.group(1)
 
-            parsed_data = json.loads(json_str)
+            parsed_data = _scan_json_value(text)
+            if parsed_data is None: # pragma: no cover
+                logger.warning(f"Could not find JSON structure in text: {text[:200]}...")
+                return None
 
-            # The prompt for parameter_extractor_agent asks for a JSON with a "jiraList" key.
+            # The extractor prompt (_EXTRACTOR_SYSTEM_MESSAGE) asks for a JSON with a "jiraList" key.
             if isinstance(parsed_data, dict) and "jiraList" in parsed_data:
                 jira_list = parsed_data["jiraList"]
                 if isinstance(jira_list, list):
@@ -352,80 +357,103 @@ class JiraBatchAgent:
                 logger.warning(f"解析的JSON既不是包含 'jiraList' 键的对象，也不是直接的列表: {text[:200]}...")
                 return None
 
-        except json.JSONDecodeError: # pragma: no cover
-            logger.warning(f"Error decoding JSON from text: {text[:200]}...")
         except Exception as e: # pragma: no cover
             logger.error(f"An unexpected error occurred during JSON extraction: {e}")
         return None
 
-    async def process_message(self, user_message: str) -> List[Dict[str, Any]]:
-        """使用Team模式处理用户输入，返回包含工单数据的JSON数组"""
-        await self.team.reset()
-
-        logger.info(f"JiraBatchAgent: 开始通过智能体团队处理用户消息: {user_message[:100]}...")
-
-        # The task for the team is the user's raw text input
-        task_result_message = await self.team.run(task=user_message)
-
-        logger.info(f"JiraBatchAgent: 团队处理完成。停止原因: {task_result_message.stop_reason if task_result_message else '未知'}")
+    async def _repair_json(self, json_content_message: TextMessage) -> Optional[str]:
+        """
+        流式调用JSON验证智能体，返回 FIXED_JSON 修复后的内容
 
-        if not task_result_message or not hasattr(task_result_message, "messages") or not task_result_message.messages:
-            logger.error("JiraBatchAgent: 团队处理失败或未返回任何消息。")
-            return []
+        验证器开头输出 VALID_JSON 时说明它认为无需修复（而本地解析已失败），
+        此时立即取消生成并返回 None，不再等待完整回复。
+        """
+        cancellation_token = CancellationToken()
+        accumulated = ""
+        async with aclosing(
+            self._new_validator_agent().on_messages_stream([json_content_message], cancellation_token)
+        ) as stream:
+            async for event in stream:
+                if isinstance(event, ModelClientStreamingChunkEvent):
+                    accumulated += event.content
+                    if "VALID_JSON" in accumulated[:32]:
+                        cancellation_token.cancel()
+                        logger.warning("JiraBatchAgent: JSON验证器认为无需修复，提前结束生成。")
+                        return None
+                elif isinstance(event, Response):
+                    message = event.chat_message
+                    if isinstance(message, TextMessage) and "FIXED_JSON" in message.content:
+                        return message.content
+                    logger.warning(f"JiraBatchAgent: JSON验证未返回修复结果。验证器消息: {message}")
+        return None
 
-        # 验证器智能体是最后一个。它的倒数第二条消息(N-1)应该包含JSON内容。
-        # 验证器的最后一条消息(N)应该是"VALID_JSON"或"FIXED_JSON..."这样的状态标记
-        final_validator_status_message = task_result_message.messages[-1]
+    async def process_message(self, user_message: str) -> List[Dict[str, Any]]:
+        """按 需求分析 -> 参数提取 的顺序直接调用智能体，返回包含工单数据的JSON数组；解析失败时再由验证智能体修复"""
+        cancellation_token = CancellationToken()
+        logger.info(f"JiraBatchAgent: 开始通过智能体处理用户消息: {user_message[:100]}...")
 
-        if not isinstance(final_validator_status_message, TextMessage) or not final_validator_status_message.content:
-            logger.error("JiraBatchAgent: 最终验证状态消息无效或为空。")
+        analysis = await self._new_analyst_agent().on_messages(
+            [TextMessage(content=user_message, source="user")], cancellation_token
+        )
+        analysis_message = analysis.chat_message
+        if not isinstance(analysis_message, TextMessage) or not analysis_message.content:
+            logger.error("JiraBatchAgent: 需求分析结果无效或为空。")
             return []
 
-        logger.debug(f"JiraBatchAgent: 验证器状态消息内容: {final_validator_status_message.content[:100]}")
-
-        # 实际的JSON内容应该在验证器最终状态消息的前一条消息中
-        # 这条消息来自参数提取智能体(parameter_extractor_agent)，或者如果JSON被修复过，则来自JSON验证智能体(json_validator_agent)
-        if len(task_result_message.messages) < 2: # pragma: no cover
-            logger.error("JiraBatchAgent: 消息列表不足，无法提取JSON内容。")
-            return []
+        # 各工单块互不依赖，拆开后并发提取参数
+        blocks = [block.strip() for block in _TICKET_SEPARATOR_RE.split(analysis_message.content)]
+        blocks = [block for block in blocks if block] or [analysis_message.content]
+        logger.info(f"JiraBatchAgent: 需求分析得到 {len(blocks)} 个工单块，并发提取参数。")
+        extractions = await asyncio.gather(*(self._extract_block(block) for block in blocks))
+
+        parsed_json_list: List[Dict[str, Any]] = []
+        for raw_content, tickets in extractions:
+            if not tickets and raw_content:
+                # 只有提取结果无法解析时才调用验证智能体修复
+                logger.warning("JiraBatchAgent: 参数提取结果无法解析为工单列表，交由JSON验证智能体修复。")
+                fixed_content = await self._repair_json(
+                    TextMessage(content=raw_content, source="parameter_extractor_tickets")
+                )
+                if fixed_content:
+                    tickets = self._extract_json_from_text(fixed_content)
+            if tickets:
+                parsed_json_list.extend(tickets)
 
-        json_content_message = task_result_message.messages[-2] # Message from parameter_extractor or fixed by validator
+        if parsed_json_list:
+            logger.info(f"JiraBatchAgent: 成功提取JSON，包含 {len(parsed_json_list)} 个工单项目。")
+            return parsed_json_list
 
-        if not isinstance(json_content_message, TextMessage) or not json_content_message.content:
-            logger.error("JiraBatchAgent: JSON内容消息无效或为空。")
-            return []
+        logger.error("JiraBatchAgent: 无法从智能体输出中提取有效的JSON列表。")
+        return []
 
-        logger.debug(f"JiraBatchAgent: 尝试从以下内容提取JSON: {json_content_message.content[:200]}")
+    async def _extract_block(self, block: str) -> Tuple[str, Optional[List[Dict[str, Any]]]]:
+        """提取单个工单块的参数，返回 (模型原始输出, 解析后的工单列表)"""
+        result = await self.parameter_extractor_client.create(
+            [
+                SystemMessage(content=_EXTRACTOR_SYSTEM_MESSAGE),
+                UserMessage(content=block, source="requirements_analyst"),
+            ]
+        )
+        content = result.content if isinstance(result.content, str) else ""
+        if not content:
+            logger.error("JiraBatchAgent: 参数提取结果无效或为空。")
+            return "", None
+        logger.debug(f"JiraBatchAgent: 尝试从以下内容提取JSON: {content[:200]}")
+        return content, self._extract_json_from_text(content)
 
-        if "VALID_JSON" in final_validator_status_message.content or "FIXED_JSON" in final_validator_status_message.content:
-            parsed_json_list = self._extract_json_from_text(json_content_message.content)
-            if parsed_json_list:
-                logger.info(
-                    f"JiraBatchAgent: 成功从团队输出中提取JSON，包含 {len(parsed_json_list)} 个工单项目。"
-                )
-                # Log model usage if available from the TaskResult
-                if hasattr(task_result_message, 'models_usage') and task_result_message.models_usage: # pragma: no cover
-                    logger.info(f"JiraBatchAgent: 模型调用消耗: {task_result_message.models_usage}")
-                return parsed_json_list
-            else: # pragma: no cover
-                logger.warning("JiraBatchAgent: 验证器指示JSON有效/已修复，但未能从其前一条消息中提取结构化JSON列表。")
-        else: # pragma: no cover
-            logger.warning(f"JiraBatchAgent: JSON验证未通过或未收到预期的验证状态。验证器消息: {final_validator_status_message.content}")
 
-        logger.error("JiraBatchAgent: 无法从团队处理结果中提取有效的JSON列表。")
-        return []
+def get_jira_batch_agent() -> JiraBatchAgent:
+    return JiraBatchAgent()
 
 
 # --- 使用示例 ---
 async def main(): # pragma: no cover
-    # 配置环境变量
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        logger.error("OPENAI_API_KEY 环境变量未设置")
+    if not settings.OPENAI_API_KEY:
+        logger.error("OPENAI_API_KEY 未配置")
         return
 
     # 初始化 JiraBatchAgent
-    jira_agent_system = JiraBatchAgent()
+    jira_agent_system = get_jira_batch_agent()
 
     # 示例用户输入
     user_inputs = [
@@ -4,40 +4,64 @@
 基于 AutoGen 最新语法实现的数据库查询智能体。
 流程：
 1. `SQLTranslator` 智能体：将自然语言转换为纯 SQLite SQL 语句；
-2. `SQLExecutor` 智能体：调用内部工具执行 SQL，返回原始结果；
+2. 直接在进程内执行 SQL（仅允许 SELECT），得到原始结果；
 3. `SQLFormatter` 智能体：将查询结果格式化成 Markdown 表格；
-
-智能体通过 `RoundRobinGroupChat` 协作，遇到 "TERMINATE" 即结束。
 """
 from __future__ import annotations
 
+import asyncio
+import re
 import sqlite3
+import threading
 from typing import Any, List, Tuple
 from loguru import logger
+import orjson
 
+from autogen_core import CancellationToken
 from autogen_agentchat.agents import AssistantAgent
-from autogen_agentchat.conditions import TextMentionTermination, MaxMessageTermination
-from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.messages import TextMessage
 
 from app.services.ai.client.openai_client import get_openai_client
-from app.db_utils import get_conn, DB_PATH
+from app.db_utils import DB_PATH, init_db
+from app.utils.async_utils import run_blocking
 
 # -----------------------------------------------------------------------------
 # SQL 执行工具
 # -----------------------------------------------------------------------------
 
 
+# 只允许执行单条 SELECT 查询
+_SELECT_ONLY = re.compile(r"^\s*SELECT\b", re.IGNORECASE)
+# 模型偶尔仍会用代码块包裹 SQL
+_CODE_FENCE = re.compile(r"^```(?:sql)?\s*|\s*```$", re.IGNORECASE)
+
+
+# 查询专用的只读长连接，首次使用时打开；多线程共用，执行与取数期间加锁
+_READ_CONN: sqlite3.Connection | None = None
+_READ_CONN_LOCK = threading.Lock()
+
+
+def _read_conn() -> sqlite3.Connection:
+    """获取只读长连接（调用方需持有 _READ_CONN_LOCK）。"""
+    global _READ_CONN
+    if _READ_CONN is None:
+        init_db()  # 确保数据库文件与表结构已存在（WAL 模式由写连接设置）
+        conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        _READ_CONN = conn
+    return _READ_CONN
+
+
 def _execute_sql(sql: str, limit: int = 30) -> Tuple[List[Tuple[Any, ...]], List[str]]:
-    """执行 SQL 并返回 (rows, columns)。"""
-    conn: sqlite3.Connection = get_conn()
-    try:
-        cursor = conn.execute(sql)
-        rows = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description] if cursor.description else []
-        return rows[:limit], columns
-    finally:
-        conn.close()
+    """执行 SQL 并返回 (rows, columns)，最多返回 limit 行。"""
+    with _READ_CONN_LOCK:
+        cursor = _read_conn().execute(sql)
+        try:
+            rows = cursor.fetchmany(limit)
+            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        finally:
+            cursor.close()
+    return rows, columns
 
 
 # -----------------------------------------------------------------------------
@@ -59,6 +83,8 @@ class SQLTeamAgent:
         if getattr(self, "_initialized", False):
             return
         self._initialized = True
+        # 智能体实例在请求间共享且保留上下文，同一时间只允许一个查询使用
+        self._lock = asyncio.Lock()
         self.model_client = get_openai_client()
         self._schema_ddl = self._load_db_schema()
         self._build_team()
@@ -69,35 +95,49 @@ class SQLTeamAgent:
 
     async def process(self, query_text: str) -> str:
         """对外统一调用。"""
-        await self.team.reset()
+        async with self._lock:
+            return await self._run(query_text)
+
+    async def _run(self, query_text: str) -> str:
+        cancellation_token = CancellationToken()
+        # 智能体会保留历史上下文，每次查询前重置
+        for agent in (self.translator, self.formatter):
+            await agent.on_reset(cancellation_token)
+
         logger.info(f"SQLTeamAgent 处理查询：{query_text}")
-        result_msg = await self.team.run(task=query_text)
-        logger.info(f"SQLTeamAgent 处理结果：{result_msg}")
-        # result_msg 是 TaskResult
-        if not result_msg or not result_msg.messages:
-            return "抱歉，未能获取查询结果。"
-        # 最后一条消息应含 TERMINATE，倒数第二条即最终内容
-        last_content = (
-            result_msg.messages[-1].content
-            if isinstance(result_msg.messages[-1], TextMessage)
-            else ""
+        translated = await self.translator.on_messages(
+            [TextMessage(content=query_text, source="user")], cancellation_token
+        )
+        sql = _CODE_FENCE.sub("", str(getattr(translated.chat_message, "content", ""))).strip()
+        logger.info(f"SQLTeamAgent 生成SQL：{sql}")
+        if not _SELECT_ONLY.match(sql):
+            logger.warning(f"SQLTeamAgent 拒绝执行非查询语句：{sql}")
+            return "抱歉，只支持查询类（SELECT）语句。"
+
+        try:
+            rows, columns = await run_blocking(_execute_sql, sql)
+            payload = orjson.dumps({"columns": columns, "rows": rows}, default=str).decode()
+        except Exception as exc:  # noqa: BLE001
+            logger.error(f"SQL 执行失败: {exc}")
+            return f"抱歉，SQL 执行失败：{exc}"
+
+        formatted = await self.formatter.on_messages(
+            [TextMessage(content=payload, source="SQLExecutor")], cancellation_token
         )
-        if "TERMINATE" in last_content:
-            # 如果执行者返回终止标记作为最后消息
-            formatted = last_content.replace("TERMINATE", "").strip()
-            return formatted
-        # 否则取倒数第二条（Formatter 输出）
-        formatter_msg = result_msg.messages[-1]
-        if isinstance(formatter_msg, TextMessage):
-            return formatter_msg.content.replace("TERMINATE", "").strip()
-        return "抱歉，未能正确解析查询结果。"
+        message = formatted.chat_message
+        logger.info(f"SQLTeamAgent 处理结果：{message}")
+
+        content = getattr(message, "content", None)
+        if not isinstance(content, str) or not content:
+            return "抱歉，未能获取查询结果。"
+        return content.strip()
 
     # ------------------------- internal ---------------------------
 
     def _build_team(self) -> None:
-        """创建 Translator / Executor / Formatter 三个 Agent."""
+        """创建 Translator / Formatter 两个 Agent."""
 
-        translator = AssistantAgent(
+        self.translator = AssistantAgent(
             name="SQLTranslator",
             model_client=self.model_client,
             system_message=(
@@ -108,56 +148,45 @@ class SQLTeamAgent:
             ),
         )
 
-        async def _executor_tool(sql_text: str) -> str:
-            """内部工具：执行 SQL 并返回原始行数据。"""
-            try:
-                rows, columns = _execute_sql(sql_text)
-                return str({"columns": columns, "rows": rows})
-            except Exception as exc:  # noqa: BLE001
-                logger.error("SQL 执行失败: %s", exc, exc_info=True)
-                return f"ERROR: {exc}"
-
-        executor = AssistantAgent(
-            name="SQLExecutor",
-            model_client=self.model_client,
-            system_message=(
-                "你是 SQL 执行助手。收到上一条消息的纯 SQL 后，调用 `_executor_tool` 工具执行并返回结果 JSON。"
-                "然后直接把工具返回内容输出，不做其他解释。"
-            ),
-            tools=[_executor_tool],
-        )
-
-        formatter = AssistantAgent(
+        self.formatter = AssistantAgent(
             name="SQLFormatter",
             model_client=self.model_client,
             system_message=(
                 "你是结果格式化助手。收到上一条消息中的 JSON 数据（包含 columns 和 rows），"
-                "将其转换为 Markdown 表格，并在结尾添加 'TERMINATE'。"
+                "将其转换为 Markdown 表格，仅输出表格本身。"
             ),
         )
 
-        termination = TextMentionTermination("TERMINATE") | MaxMessageTermination(12)
-        self.team = RoundRobinGroupChat(
-            participants=[translator, executor, formatter],
-            termination_condition=termination,
-        )
-
     def _load_db_schema(self) -> str:
-        """动态提取数据库表结构，以便提供给 Translator."""
-        conn = sqlite3.connect(DB_PATH)
-        try:
-            lines: list[str] = []
-            tables = conn.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
-            for (tbl,) in tables:
-                lines.append(f"表 {tbl} 字段：")
-                cols = conn.execute(f"PRAGMA table_info({tbl});").fetchall()
-                for _, name, col_type, notnull, _, pk in cols:
-                    lines.append(
-                        f"- {name} {col_type} {'NOT NULL' if notnull else ''} {'PRIMARY KEY' if pk else ''}"
-                    )
-            return "\n".join(lines)
-        finally:
-            conn.close()
+        """提取数据库表结构（紧凑 DDL），以便提供给 Translator."""
+        return _load_db_schema()
+
+
+# 表结构缓存：(schema_version, 紧凑 DDL)，表结构未变化时直接复用
+_SCHEMA_CACHE: Tuple[int, str] | None = None
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _load_db_schema() -> str:
+    """
+    读取所有业务表的建表语句并压缩空白，减少 Translator 提示词的 token 数
+
+    以 PRAGMA schema_version 作为缓存键，建表/改表后自动失效。
+    """
+    global _SCHEMA_CACHE
+    with _READ_CONN_LOCK:
+        conn = _read_conn()
+        version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        if _SCHEMA_CACHE is not None and _SCHEMA_CACHE[0] == version:
+            return _SCHEMA_CACHE[1]
+        rows = conn.execute(
+            "SELECT sql FROM sqlite_master "
+            "WHERE type='table' AND sql IS NOT NULL AND name NOT LIKE 'sqlite_%'"
+        ).fetchall()
+
+    ddl = "\n".join(_WHITESPACE.sub(" ", sql).strip() + ";" for (sql,) in rows)
+    _SCHEMA_CACHE = (version, ddl)
+    return ddl
 
 
 def get_sql_team_agent() -> SQLTeamAgent:
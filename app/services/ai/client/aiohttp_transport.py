@@ -0,0 +1,101 @@
+# aiohttp_transport.py
+"""
+基于 aiohttp 的 httpx 传输层。
+
+OpenAI SDK 只接受 httpx.AsyncClient，在大量并发请求时 httpx 连接池争用明显；
+这里把实际收发交给 aiohttp，SDK 的重试、超时、流式解析等逻辑保持不变。
+"""
+import asyncio
+from typing import AsyncIterator, Optional
+
+import aiohttp
+import httpx
+
+
+class _AiohttpResponseStream(httpx.AsyncByteStream):
+    """把 aiohttp 响应体包装为 httpx 的异步字节流，关闭时归还连接"""
+
+    def __init__(self, response: aiohttp.ClientResponse, request: httpx.Request):
+        self._response = response
+        self._request = request
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self._response.content.iter_any():
+                yield chunk
+        except asyncio.TimeoutError as exc:
+            raise httpx.ReadTimeout(str(exc), request=self._request) from exc
+        except aiohttp.ClientError as exc:
+            raise httpx.ReadError(str(exc), request=self._request) from exc
+
+    async def aclose(self) -> None:
+        self._response.release()
+
+
+class AiohttpTransport(httpx.AsyncBaseTransport):
+    """
+    使用 aiohttp.ClientSession 收发请求的 httpx 传输层
+
+    会话在首次请求时于当前事件循环中创建；响应不自动解压，由 httpx 按 Content-Encoding 解码。
+    """
+
+    def __init__(
+        self,
+        limit: int = 200,
+        limit_per_host: int = 100,
+        keepalive_timeout: float = 60,
+        ttl_dns_cache: int = 300,
+    ):
+        self._connector_options = {
+            "limit": limit,
+            "limit_per_host": limit_per_host,
+            "keepalive_timeout": keepalive_timeout,
+            "ttl_dns_cache": ttl_dns_cache,
+        }
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(**self._connector_options),
+                auto_decompress=False,
+            )
+        return self._session
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        timeouts = request.extensions.get("timeout", {})
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=timeouts.get("pool"),
+            sock_connect=timeouts.get("connect"),
+            sock_read=timeouts.get("read"),
+        )
+        try:
+            response = await self._get_session().request(
+                request.method,
+                str(request.url),
+                headers=[(key.decode("latin-1"), value.decode("latin-1")) for key, value in request.headers.raw],
+                data=await request.aread(),
+                timeout=timeout,
+                allow_redirects=False,
+                # 请求头已由 httpx 生成，aiohttp 不再补充默认头
+                skip_auto_headers=("Accept-Encoding", "User-Agent", "Content-Type"),
+            )
+        except asyncio.TimeoutError as exc:
+            raise httpx.TimeoutException(str(exc), request=request) from exc
+        except aiohttp.ClientConnectorError as exc:
+            raise httpx.ConnectError(str(exc), request=request) from exc
+        except aiohttp.ClientError as exc:
+            raise httpx.NetworkError(str(exc), request=request) from exc
+
+        return httpx.Response(
+            status_code=response.status,
+            headers=response.raw_headers,
+            stream=_AiohttpResponseStream(response, request),
+            extensions={"http_version": b"HTTP/1.1"},
+        )
+
+    async def aclose(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -3,20 +3,36 @@
 统一封装 OpenAIChatCompletionClient，支持全局默认配置和参数覆盖。
 同时支持 Gemini 模型客户端。
 """
-import os
+import asyncio
+import hashlib
+import json
+import weakref
+from functools import lru_cache
+from typing import Any, Dict, Mapping, Optional, Sequence
+
+import httpx
+from openai import DefaultAsyncHttpxClient
+
 from autogen_ext.models.openai import OpenAIChatCompletionClient
-from autogen_core.models import ModelFamily
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    AssistantMessage,
+    CreateResult,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+    ModelFamily,
+)
+from autogen_core.tools import Tool, ToolSchema
 from loguru import logger
-import collections.abc
-from dotenv import load_dotenv
 
-# 加载环境变量
-load_dotenv()
+from app.core.config import settings
+from app.services.ai.client.aiohttp_transport import AiohttpTransport
+from app.utils.ttl_cache import TTLCache
 
 
 # 全局默认配置，绝大多数场景无需再传递重复参数
 _DEFAULT_CONFIG = {
-    "api_key": os.getenv("OPENAI_API_KEY"),
+    "api_key": settings.OPENAI_API_KEY,
     "base_url": "https://dashscope.aliyuncs.com/compatible-mode/v1",
     # "model": "qwen-flash",
     "model": "qwen3-coder-plus",
@@ -30,22 +46,170 @@ _DEFAULT_CONFIG = {
     },
 }
 
-def deep_merge_dicts(base_dict, update_dict):
+# 去掉 None 值后的默认配置，导入时计算一次，无覆盖参数时直接复用
+_BASE_VALID = {k: v for k, v in _DEFAULT_CONFIG.items() if v is not None}
+_BASE_OPENAI_VALID = {**_BASE_VALID, "temperature": 0}
+
+
+def _merge_config(base: Mapping[str, Any], overrides: Mapping[str, Any]) -> Dict[str, Any]:
     """
-    递归合并两个字典。
-    update_dict 中的值会覆盖 base_dict 中的值。
-    如果两个字典在同一键上的值都是字典，则递归合并它们。
+    合并客户端配置：配置结构固定，只有 model_info 一个嵌套字典，
+    其余键直接浅合并，model_info 再合并一层；overrides 为空时只做一次浅拷贝。
     """
-    merged = base_dict.copy()
-    for key, value in update_dict.items():
-        if isinstance(value, collections.abc.Mapping) and \
-           isinstance(merged.get(key), collections.abc.Mapping):
-            merged[key] = deep_merge_dicts(merged[key], value)
-        else:
-            merged[key] = value
+    merged = {**base, **overrides}
+    if "model_info" in overrides and "model_info" in base:
+        merged["model_info"] = {**base["model_info"], **overrides["model_info"]}
     return merged
 
 
+# 模型响应缓存，所有客户端实例共享；LLM_CACHE_TTL 为 0 时不缓存
+_RESPONSE_CACHE: TTLCache[CreateResult] = TTLCache(maxsize=1024, ttl=settings.LLM_CACHE_TTL)
+
+
+# 每个事件循环共享一个 HTTP 连接池，所有模型客户端复用 TCP/TLS 连接
+_HTTP_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _with_shared_http_client(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    为客户端配置注入当前事件循环共享的 HTTP 客户端
+
+    并发请求无法在服务端合并为一次调用，但共用连接池可省去每个客户端各自建连的开销；
+    不在事件循环中调用时保持原样，由 SDK 自行创建。
+    """
+    if "http_client" in config:
+        return config
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return config
+    http_client = _HTTP_CLIENTS.get(loop)
+    if http_client is None or http_client.is_closed:
+        # 实际收发交给 aiohttp 连接池，高并发下不受 httpx 连接池争用影响；
+        # 空闲连接保留 60 秒，多智能体轮流发言之间的间隔内不必重新握手
+        http_client = DefaultAsyncHttpxClient(
+            transport=AiohttpTransport(limit=200, limit_per_host=100, keepalive_timeout=60)
+        )
+        _HTTP_CLIENTS[loop] = http_client
+    config["http_client"] = http_client
+    return config
+
+
+def _freeze(value: Any) -> Any:
+    """把配置中的字典递归转换为可哈希的元组，用作客户端缓存键"""
+    if isinstance(value, Mapping):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    """_freeze 的逆操作"""
+    if isinstance(value, tuple) and all(isinstance(item, tuple) and len(item) == 2 for item in value):
+        return {k: _thaw(v) for k, v in value}
+    return value
+
+
+@lru_cache(maxsize=16)
+def _build_client(client_cls: type, frozen_config: tuple) -> OpenAIChatCompletionClient:
+    """按配置缓存客户端实例，相同配置（含同一事件循环的 HTTP 连接池）复用同一个客户端"""
+    return client_cls(**_thaw(frozen_config))
+
+
+def _client_for(client_cls: type, config: Dict[str, Any]) -> OpenAIChatCompletionClient:
+    """注入共享 HTTP 客户端后，从缓存中获取或创建模型客户端"""
+    # 密钥只来自 settings 或调用参数；缺失时立即报错，不再让 SDK 回退到进程环境变量
+    if not config.get("api_key"):
+        raise RuntimeError("LLM key missing: 未配置 OPENAI_API_KEY，且调用时未传入 api_key")
+    config = _with_shared_http_client(config)
+    try:
+        return _build_client(client_cls, _freeze(config))
+    except TypeError:
+        # 配置中含不可哈希的值（如列表），不做缓存
+        return client_cls(**config)
+
+
+async def close_model_clients() -> None:
+    """应用关闭时调用：清空客户端缓存并关闭当前事件循环共享的 HTTP 连接池"""
+    _build_client.cache_clear()
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    http_client = _HTTP_CLIENTS.pop(loop, None)
+    if http_client is not None and not http_client.is_closed:
+        await http_client.aclose()
+
+
+def _involves_tool_call(message: LLMMessage) -> bool:
+    """消息是否为工具调用或工具执行结果"""
+    if isinstance(message, FunctionExecutionResultMessage):
+        return True
+    return isinstance(message, AssistantMessage) and not isinstance(message.content, str)
+
+
+class CachedOpenAIChatCompletionClient(OpenAIChatCompletionClient):
+    """
+    带响应缓存的 OpenAIChatCompletionClient
+
+    temperature 为 0 时，相同的模型、消息和输出格式视为同一请求，
+    在有效期内直接返回上次的 CreateResult，不再调用模型接口。
+    带工具的请求和包含工具调用/结果的对话不缓存：其正确结果取决于 JIRA、SSH、天气等实时数据。
+    流式调用 create_stream 不做缓存。
+    """
+
+    def _cache_key(
+        self,
+        messages: Sequence[LLMMessage],
+        tools: Sequence[Tool | ToolSchema],
+        json_output: Optional[bool | type],
+        extra_create_args: Mapping[str, Any],
+    ) -> Optional[str]:
+        """计算缓存键，不满足缓存条件时返回 None"""
+        if not settings.LLM_CACHE_TTL or self._raw_config.get("temperature", 1) != 0:
+            return None
+        if tools or any(_involves_tool_call(m) for m in messages):
+            return None
+        payload = {
+            "model": self._raw_config.get("model"),
+            "base_url": self._raw_config.get("base_url"),
+            "response_format": self._raw_config.get("response_format"),
+            "messages": [m.model_dump() for m in messages],
+            "json_output": json_output.__name__ if isinstance(json_output, type) else json_output,
+            "extra_create_args": dict(extra_create_args),
+        }
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool | type] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        key = self._cache_key(messages, tools, json_output, extra_create_args)
+        if key is not None:
+            cached = _RESPONSE_CACHE.get(key)
+            if cached is not None:
+                logger.debug(f"模型响应缓存命中: {key[:12]}")
+                return cached.model_copy(update={"cached": True})
+
+        result = await super().create(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+        if key is not None and result.finish_reason == "stop":
+            _RESPONSE_CACHE.set(key, result)
+        return result
+
+
 def get_openai_client(**overrides) -> OpenAIChatCompletionClient:
     """
     获取 OpenAIChatCompletionClient 实例，支持参数覆盖。
@@ -54,14 +218,27 @@ def get_openai_client(**overrides) -> OpenAIChatCompletionClient:
         client = get_openai_client(api_key="xxx", model="gpt-4o")
     """
 
-    config = deep_merge_dicts(_DEFAULT_CONFIG.copy(), overrides)
+    if not overrides:
+        return _client_for(CachedOpenAIChatCompletionClient, dict(_BASE_OPENAI_VALID))
 
-    # 过滤掉 None 的参数，防止传递无效参数
+    config = _merge_config(_BASE_OPENAI_VALID, overrides)
+    # 过滤掉覆盖参数中的 None，防止传递无效参数
     valid_config = {k: v for k, v in config.items() if v is not None}
     valid_config["temperature"] = 0
 
     # logger.info(f"OpenAIChatCompletionClient创建成功: {valid_config}")
-    return OpenAIChatCompletionClient(**valid_config)
+    return _client_for(CachedOpenAIChatCompletionClient, valid_config)
+
+def get_json_openai_client(**overrides) -> OpenAIChatCompletionClient:
+    """
+    获取开启 JSON 模式（response_format=json_object）的客户端，模型输出保证为合法 JSON 对象。
+    注意：JSON 模式要求提示词中包含 "JSON" 字样。
+    """
+    json_overrides = {
+        "response_format": {"type": "json_object"},
+        "model_info": {"json_output": True},
+    }
+    return get_openai_client(**_merge_config(json_overrides, overrides))
 
 def get_kimi_k2_client(**overrides) -> OpenAIChatCompletionClient:
     """
@@ -70,17 +247,17 @@ def get_kimi_k2_client(**overrides) -> OpenAIChatCompletionClient:
     用法：
         client = get_kimi_k2_client(model="Moonshot-Kimi-K2-Instruct")
     """
-    config = deep_merge_dicts(_DEFAULT_CONFIG.copy(), overrides)
-    # 过滤掉 None 的参数，防止传递无效参数
-    valid_config = {k: v for k, v in config.items() if v is not None}
+    config = _merge_config(_BASE_VALID, overrides)
+    # 过滤掉覆盖参数中的 None，防止传递无效参数
+    valid_config = {k: v for k, v in config.items() if v is not None} if overrides else config
     valid_config["model"] = "Moonshot-Kimi-K2-Instruct"
     # logger.info(f"Kimi K2 模型客户端创建成功: {valid_config}")
-    return OpenAIChatCompletionClient(**valid_config)
+    return _client_for(OpenAIChatCompletionClient, valid_config)
 
 
 # Gemini 模型客户端默认配置 - gemini 不需要输入base_url
 _GEMINI_DEFAULT_CONFIG = {
-    "api_key": os.getenv("GEMINI_API_KEY"),
+    "api_key": settings.GEMINI_API_KEY,
     "model": "gemini-2.5-flash",
     "model_info": {
         "vision": True,
@@ -92,6 +269,9 @@ _GEMINI_DEFAULT_CONFIG = {
     },
 }
 
+# 去掉 None 值后的 Gemini 默认配置，导入时计算一次
+_BASE_GEMINI_VALID = {k: v for k, v in _GEMINI_DEFAULT_CONFIG.items() if v is not None}
+
 
 def get_gemini_client(**overrides) -> OpenAIChatCompletionClient:
     """
@@ -100,13 +280,13 @@ def get_gemini_client(**overrides) -> OpenAIChatCompletionClient:
     用法：
         client = get_gemini_client(model="gemini-2.5-flash")
     """
-    config = deep_merge_dicts(_GEMINI_DEFAULT_CONFIG.copy(), overrides)
-    # 过滤掉 None 的参数，防止传递无效参数
-    valid_config = {k: v for k, v in config.items() if v is not None}
+    config = _merge_config(_BASE_GEMINI_VALID, overrides)
+    # 过滤掉覆盖参数中的 None，防止传递无效参数
+    valid_config = {k: v for k, v in config.items() if v is not None} if overrides else config
 
     # 检查 API Key 是否存在
     if not valid_config.get("api_key"):
         logger.warning("未配置 GEMINI_API_KEY，将使用默认 OpenAI 客户端")
         return get_openai_client(**overrides)
 
-    return OpenAIChatCompletionClient(**valid_config)
+    return _client_for(OpenAIChatCompletionClient, valid_config)
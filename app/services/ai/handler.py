@@ -5,18 +5,35 @@
 AI消息处理器模块，使用AutoGen SelectorGroupChat多智能体实现智能问答和意图识别
 """
 
-import os
+import asyncio
+import hashlib
+import json
+import re
 import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from types import MappingProxyType
+from weakref import WeakValueDictionary
+from functools import cached_property
 from autogen_agentchat.base import TaskResult
 from loguru import logger
-from typing import Optional
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Mapping, NamedTuple, Optional, Sequence, Tuple
 
 from autogen_agentchat.conditions import MaxMessageTermination, TextMentionTermination
 from autogen_agentchat.agents import AssistantAgent
+from autogen_agentchat.base import Response
 from autogen_agentchat.teams import SelectorGroupChat
-from autogen_agentchat.messages import TextMessage
-from autogen_agentchat.ui import Console
-from autogen_ext.memory.chromadb import ChromaDBVectorMemory  # Added import
+from autogen_agentchat.messages import (
+    BaseAgentEvent,
+    BaseChatMessage,
+    ModelClientStreamingChunkEvent,
+    TextMessage,
+    ToolCallSummaryMessage,
+)
+from autogen_core import CancellationToken
+from autogen_core.models import AssistantMessage, CreateResult, SystemMessage, UserMessage
+from autogen_core.tools import FunctionTool
 
 from app.core.config import settings
 
@@ -28,9 +45,299 @@ from app.services.ai.tools import (
     process_ssh_request,
     process_sql_query,
 )
-from app.db_utils import save_conversation_record
+from app.db_utils import asave_conversation_record
+from app.utils.ttl_cache import TTLCache
+
+# chromadb 依赖较重，仅用于类型注解，运行时不导入
+if TYPE_CHECKING:
+    from autogen_ext.memory.chromadb import ChromaDBVectorMemory
+
+# 当前处理中消息的发送者和会话，供工具封装读取
+_sender_id: ContextVar[str] = ContextVar("sender_id", default="unknown_sender")
+_conversation_id: ContextVar[str] = ContextVar("conversation_id", default="unknown_conversation")
+
+# 意图明确的关键词直接路由到对应智能体，不经过选择器；
+# 各组关键词合并为一个正则，分组名对应智能体构建方法 _build_<分组名>，一次扫描即可得到全部命中的分组
+_KEYWORD_ROUTE_RE = re.compile(
+    r"(?P<jira_specialist_agent>jira|工单|提单)"
+    r"|(?P<server_admin_agent>dify|ssh|服务器)"
+    r"|(?P<general_assistant_agent>天气|气温|weather)",
+    re.IGNORECASE,
+)
+
+
+def _matched_routes(text: str) -> set[str]:
+    """返回文本命中的关键词分组（智能体构建方法名后缀）"""
+    return {match.lastgroup for match in _KEYWORD_ROUTE_RE.finditer(text)}
+
+# 相同提问的回复缓存有效期（秒）；只缓存知识库和通用问答，
+# 服务器、JIRA、天气等结果随时间变化或有副作用的请求不缓存
+REPLY_CACHE_TTL = 60
+_CACHEABLE_AGENTS = frozenset({"KnowledgeExpert", "GeneralAssistant"})
+
+
+def _reply_cache_key(text: str) -> str:
+    """回复缓存键：忽略首尾空白和大小写"""
+    return text.strip().lower()
+
+
+# 同一发送者在该时间窗口（秒）内重复发送相同消息（重试、连点）时直接返回上次回复
+DUPLICATE_WINDOW = 30
+
+# 无需调用模型即可回复的寒暄语，键为归一化后的消息
+_DIRECT_REPLIES = MappingProxyType(
+    {
+        "你好": "你好！请问有什么可以帮您？",
+        "您好": "您好！请问有什么可以帮您？",
+        "hi": "你好！请问有什么可以帮您？",
+        "hello": "你好！请问有什么可以帮您？",
+        "在吗": "在的，请问有什么可以帮您？",
+        "在不在": "在的，请问有什么可以帮您？",
+        "谢谢": "不客气，还有其他需要随时找我。",
+        "多谢": "不客气，还有其他需要随时找我。",
+    }
+)
+_EMPTY_REPLY = "请问有什么可以帮您？"
+_BLOCKED_REPLY = "抱歉，无法处理该请求。"
+_DIRECT_REPLY_SOURCE = "DirectReply"
+
+# 明显的提示词注入
+_INJECTION_RE = re.compile(
+    r"(忽略|无视|忘记)(掉)?(你)?(之前|以上|上面|上述|前面|所有)的?(所有)?(指令|指示|提示|规则|设定)"
+    r"|(输出|打印|泄露|告诉我)(你的)?(系统提示词|system\s*prompt)"
+    r"|ignore\s+(all\s+)?(the\s+)?(previous|above|prior)\s+(instructions|prompts?)",
+    re.IGNORECASE,
+)
+
+_TRIVIAL_PUNCTUATION = " \t\r\n!！?？。.,，~～、"
+
+
+def _duplicate_key(text: str, sender_id: str, conversation_id: str) -> Tuple[str, str, str]:
+    """重复消息去重键：会话 + 发送者 + 消息内容摘要，群聊和单聊中的同一句话互不影响"""
+    return conversation_id, sender_id, hashlib.sha1(text.strip().encode("utf-8")).hexdigest()
+
+
+def _normalize_trivial(text: str) -> str:
+    """寒暄匹配用的归一化：去掉首尾空白和标点并转小写"""
+    return text.strip(_TRIVIAL_PUNCTUATION).lower()
+
+
+def _is_stateful_request(text: str) -> bool:
+    """命中任一直达关键词（JIRA、服务器、天气）的请求视为有状态请求，不缓存回复"""
+    return _KEYWORD_ROUTE_RE.search(text) is not None
+
+
+# 最多保留多少个会话的团队状态
+MAX_CONVERSATION_STATES = 128
+
+# 团队实例池上限：不同会话可同时运行各自的团队，与钉钉消息消费协程数一致
+MAX_CONCURRENT_TEAMS = 4
+
+# 保存会话状态时，每段消息历史最多保留的条数；大于单轮上限（MaxMessageTermination 25 条），保证最近一轮完整
+MAX_HISTORY_MESSAGES = 30
+
+# 每个会话保留的最近对话轮数，供路由模型、直达智能体理解追问
+MAX_RECENT_TURNS = 6
+
+# 最近对话的有效期（秒），超过后视为新的对话
+RECENT_TURN_TTL = 1800
+
+# 回放给模型的历史回复使用的消息来源，不与团队成员同名
+_HISTORY_REPLY_SOURCE = "assistant"
+
+
+class _Turn(NamedTuple):
+    """会话中已处理的一轮对话"""
+
+    question: str
+    reply: str
+    # 是否由 SelectorGroupChat 处理，团队状态中已包含这一轮
+    via_team: bool
+    timestamp: float
+
+
+def _history_messages(history: Sequence[_Turn]) -> list[BaseChatMessage]:
+    """把最近几轮对话转换为智能体可接收的消息列表"""
+    messages: list[BaseChatMessage] = []
+    for turn in history:
+        messages.append(TextMessage(content=turn.question, source="user"))
+        messages.append(TextMessage(content=turn.reply, source=_HISTORY_REPLY_SOURCE))
+    return messages
+
+
+# 团队状态中保存消息历史的字段：管理器的 message_thread、智能体容器的 message_buffer、模型上下文的 messages
+_HISTORY_KEYS = frozenset({"message_thread", "message_buffer", "messages"})
+
+
+def _trim_messages(messages: list, limit: int) -> list:
+    """只保留最近 limit 条消息，并从一条用户消息开始，避免留下没有对应调用的工具结果"""
+    if len(messages) <= limit:
+        return messages
+    tail = messages[-limit:]
+    for index, message in enumerate(tail):
+        if isinstance(message, Mapping) and message.get("source") == "user":
+            return tail[index:]
+    return []
+
+
+def _trim_team_state(state: Any, limit: int = MAX_HISTORY_MESSAGES) -> Any:
+    """递归截断团队状态中的各段消息历史，控制每轮发送给选择器和智能体的上下文长度"""
+    if not isinstance(state, Mapping):
+        return state
+    return {
+        key: _trim_messages(value, limit)
+        if key in _HISTORY_KEYS and isinstance(value, list)
+        else _trim_team_state(value, limit)
+        for key, value in state.items()
+    }
+
+# 智能体回复结束标记
+_TERMINATE = "TERMINATE"
+
+# 配置了钉钉 AI 卡片模板时，智能体以流式方式调用模型，生成过程中即可把文本片段推送给用户
+STREAM_REPLIES = bool(settings.DINGTALK_AI_CARD_TEMPLATE_ID)
+
+# 接收模型流式输出文本片段的回调
+StreamCallback = Callable[[str], Awaitable[None]]
+
+# 智能体系统提示词：不带缩进和首尾空白的模块常量，每次请求发送的系统消息前缀完全一致，便于服务端前缀缓存命中
+_SM_KNOWLEDGE = """你是一个知识库专家。如果用户的问题需要从知识库中查找答案，请调用`search_knowledge_base`工具，并使用用户原始提问作为查询参数。
+
+**重要的回复格式要求：**
+1. 必须先调用知识库工具获取搜索结果
+2. 根据工具返回的结果回答用户问题
+3. 如果工具未返回有效信息，请告知用户知识库中没有相关内容
+4. 最后在回复末尾添加'TERMINATE'
+
+绝对不要只返回'TERMINATE'而不包含搜索结果或回答！"""
+
+_SM_SERVER = """你是一个服务器管理专家。负责处理服务器操作、Dify服务管理、SSH连接、日志分析等问题。
+
+当用户请求涉及以下内容时，必须调用`_process_ssh_request_tool`工具：
+1. 查看服务器状态（磁盘、内存、进程等）
+2. 需要操作服务器，执行相关的服务器命令的时候
+3. Dify服务升级或维护
+
+工具参数说明：
+- request_text: 用户原始请求文本
+- host: 目标主机地址（默认传空）
+- mode: 操作模式 (free/upgrade)
+
+特别注意：
+- 对于明确的Dify升级请求，必须使用mode='upgrade'
+- 其他SSH操作使用mode='free'
+- 不要直接给出建议，必须调用工具获取实际执行结果
+
+**重要的回复格式要求：**
+1. 必须先调用SSH工具获取执行结果
+2. 对工具返回的内容进行归纳整理
+3. 最后部分添加TERMINATE
+
+绝对不要只返回'TERMINATE'而不包含工具执行结果！
+绝对不要使用占位符文本如'[SSH工具返回的完整结果]'！"""
+
+_SM_JIRA = """你是一个JIRA任务专家。如果用户想要创建JIRA工单/任务，请调用`_process_jira_request_tool`工具，并将用户的完整原始请求作为参数。
+
+**重要的回复格式要求：**
+1. 必须先调用JIRA工具处理用户请求
+2. 将工具返回的完整结果作为你的回复内容
+3. 不要省略或修改工具返回的任何信息
+4. 无论工具调用成功或失败，都要包含完整的工具信息
+5. 最后在回复末尾添加'TERMINATE'
+
+绝对不要只返回'TERMINATE'而不包含工具执行结果！"""
+
+_SM_SQL = """你是一个数据库查询专家，能够将中文自然语言问题转换为SQL并查询本地数据库。
+当且仅当用户的问题涉及数据库检索、数据统计或者明显需要查询本地数据时
+调用`_process_sql_query_tool`工具。
+工具参数说明：
+- nl_text: 要检索查询的问题。例如，"当前数据库有哪些用户？"
+    **重要的回复格式要求：**
+    1. 需要检索查询时，必须先调用SQL工具获取查询结果
+    2. 根据工具返回的结果进行简要解释或总结
+    3. 最后在回复末尾添加'TERMINATE'
+
+绝对不要只返回'TERMINATE'而不包含查询结果！"""
+
+_SM_GENERAL = """你是一个通用的AI助手。负责回答引导用户，或进行闲聊，查看天气等等。
+你可以告诉用户你会什么技能包括：
+1. 服务器管理
+```
+ dify服务重启
+ dify服务自动化升级
+ 系统运行状态查询
+ 天气查询、支持、当前、近七天、支持历史查询
+```
+2. 本地数据库的查询和分析
+3. JIRA需求提单：告诉用户提单格式要求：
+```
+    配置jira信息
+    **用户名**: `your_jira_username`
+    **密码**: `your_jira_password`
+
+```
+格式要求：
+```
+1. 需求描述中最好包含客户名称的相关信息
+2. 不限制内容，但要确保信息基本可用
+3. 默认批量提单，如果不需要批量，请在描述中体现
+```
+---
+你的回答尽量整理成一个标准markdown格式的文档，语言风趣幽默。按照回复、需求、问题、建议等不同的场景，支持多种丰富的markdown语法，如：
+```
+1. **加粗**
+2. *斜体*
+3. `代码`
+4. [链接](https://www.example.com)
+5. ![图片](https://www.example.com/image.png)
+6. 表格
+7. 列表
+8. mermaid图表
+9. 互联网风格icon
+```
+如果你的得到的信息有来源，请标明来源。
+
+回答完毕后，请以'TERMINATE'结束你的回复。"""
+
+# --- Router Prompt ---#
+# 路由模型一次调用即完成选择：直接调用动作类工具或直接作答，其余情况交给 SelectorGroupChat
+_SM_ROUTER = """你是钉钉智能助手的入口。根据用户消息选择一种处理方式：
+1. 请求明确属于某个工具的职责（知识库检索、JIRA提单、服务器操作、数据库查询、天气查询）时，直接调用该工具，参数取自用户原话；
+2. 日常寒暄或简单的一般性问题，直接用中文简洁作答，不调用工具；
+3. 询问机器人能力或提单格式、或需要多个专家协作时，调用 transfer_to_team。
+用户消息可能是对之前对话的追问，请结合上文补全工具参数（例如上文查询了杭州天气，本次问“那明天呢”，应查询杭州明天的天气）。
+每次最多调用一个工具。"""
+
+_TRANSFER_TO_TEAM = "transfer_to_team"
+_TRANSFER_TO_TEAM_SCHEMA = {
+    "name": _TRANSFER_TO_TEAM,
+    "description": "把请求交给多智能体团队处理",
+    "parameters": {"type": "object", "properties": {}},
+}
+
+# 路由模型直接作答时记录的智能体名称
+_ROUTER_DIRECT_SOURCE = "GeneralAssistant"
+
+# 知识库检索结果只是参考资料，需要再调用一次模型据此作答
+_SM_KNOWLEDGE_ANSWER = """你是一个知识库专家。请仅根据用户消息中提供的知识库检索结果回答问题；检索结果中没有相关内容时，告知用户知识库中没有相关信息。"""
+_KNOWLEDGE_TOOL = "search_knowledge_base"
+
+# 已有团队状态的会话中，这类消息依赖之前的对话内容，继续交给团队处理
+_FOLLOW_UP_RE = re.compile(
+    r"^\s*(那|还有|继续|然后|再|接着|详细|具体|展开|刚才|上面|上一|前面|这个|那个|它|第[一二三四五六七八九十\d]+)"
+)
+# 不超过该长度的消息（如“为什么”“好的”）在已有会话中也视为追问
+_FOLLOW_UP_MAX_LENGTH = 4
+
+
+def _is_follow_up(text: str) -> bool:
+    """判断消息是否为依赖上文的追问"""
+    return len(text.strip()) <= _FOLLOW_UP_MAX_LENGTH or _FOLLOW_UP_RE.search(text) is not None
 
 # --- Selector Prompt ---#
+# 选择器使用的模型，工作智能体仍使用默认模型
+SELECTOR_MODEL = "qwen-flash"
+
 SELECTOR_PROMPT_ZH = """你是一个智能路由选择器。根据用户的最新请求内容，从以下可用智能体中选择最合适的一个来处理该请求。
 请仔细阅读智能体的描述，确保选择最相关的智能体。
 
@@ -44,10 +351,20 @@ SELECTOR_PROMPT_ZH = """你是一个智能路由选择器。根据用户的最
 选择的智能体:"""
 
 
+def _render_selector_prompt(agents: Sequence[AssistantAgent]) -> str:
+    """
+    预先填入 {roles}：智能体列表在处理器生命周期内不变，
+    SelectorGroupChat 每轮选择时只需再填充 {history}
+    """
+    roles = "\n".join(f"{agent.name}: {agent.description}".strip() for agent in agents)
+    # 描述中的花括号需转义，避免被后续的 str.format 当作占位符
+    return SELECTOR_PROMPT_ZH.replace("{roles}", roles.replace("{", "{{").replace("}", "}}"))
+
+
 class AIMessageHandler:
     """AI消息处理器，基于AutoGen SelectorGroupChat实现多智能体对话和意图识别"""
 
-    def __init__(self, vector_memory: Optional[ChromaDBVectorMemory] = None):
+    def __init__(self, vector_memory: Optional["ChromaDBVectorMemory"] = None):
         """初始化AI消息处理器"""
         self.shared_vector_memory = vector_memory
         if self.shared_vector_memory:
@@ -57,19 +374,75 @@ class AIMessageHandler:
                 "AIMessageHandler initialized without shared vector_memory. Knowledge base functionality will be limited."
             )
 
-        self._setup_api_keys()
         self.model_client = get_openai_client(model_info={"json_output": False})
-        self._init_agents_and_groupchat()
+        # 各会话的团队状态，按最近使用顺序淘汰
+        self._conversation_states: "OrderedDict[str, Mapping[str, Any]]" = OrderedDict()
+        # 各会话最近几轮对话（无论由哪条路径处理），按最近使用顺序淘汰
+        self._recent_turns: "OrderedDict[str, deque[_Turn]]" = OrderedDict()
+        # 空闲的团队实例，按需创建，最多 MAX_CONCURRENT_TEAMS 个
+        self._team_pool: "asyncio.Queue[SelectorGroupChat]" = asyncio.Queue()
+        self._team_count = 0
+        # 同一会话的消息按顺序处理，保证团队状态的读取和保存不交错
+        self._conversation_locks: "WeakValueDictionary[str, asyncio.Lock]" = WeakValueDictionary()
+        # 相同提问的选择器结果缓存：提问 -> 智能体名称
+        self._selection_cache: TTLCache[str] = TTLCache(maxsize=1024, ttl=settings.LLM_CACHE_TTL)
+        # 同一会话相同提问的回复缓存：(会话ID, 提问) -> (最终回复, 智能体名称)
+        self._reply_cache: TTLCache[Tuple[str, Optional[str]]] = TTLCache(
+            maxsize=512, ttl=REPLY_CACHE_TTL
+        )
+        # 同一会话中同一发送者短时间内的重复消息：(会话ID, 发送者, 消息摘要) -> (最终回复, 智能体名称)
+        self._recent_replies: TTLCache[Tuple[str, Optional[str]]] = TTLCache(
+            maxsize=4096, ttl=DUPLICATE_WINDOW
+        )
 
-        self._current_sender_id: Optional[str] = None
-        self._current_conversation_id: Optional[str] = None
+    def _try_direct_reply(
+        self, text: str, sender_id: str, conversation_id: str
+    ) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        无需调用模型的请求直接给出回复：空消息、寒暄、同一会话中同一发送者的重复消息以及明显的提示词注入
 
-    def _setup_api_keys(self):
-        """设置API密钥"""
-        if settings.OPENAI_API_KEY:
-            os.environ["OPENAI_API_KEY"] = settings.OPENAI_API_KEY
-        else:
-            logger.warning("未配置任何LLM API密钥，AI功能可能受限或无法使用")
+        “继续”“详细”等追问每次都依赖最新的上下文，重复发送也不复用上次回复。
+
+        Returns:
+            (回复, 智能体名称)，需要交给模型处理时返回 None
+        """
+        normalized = _normalize_trivial(text)
+        if len(normalized) < 2:
+            return _EMPTY_REPLY, _DIRECT_REPLY_SOURCE
+        reply = _DIRECT_REPLIES.get(normalized)
+        if reply is not None:
+            return reply, _DIRECT_REPLY_SOURCE
+        if not _is_follow_up(text):
+            recent = self._recent_replies.get(_duplicate_key(text, sender_id, conversation_id))
+            if recent is not None:
+                return recent
+        if _INJECTION_RE.search(text):
+            logger.warning(f"拦截疑似提示词注入的消息 from {sender_id}: {text}")
+            return _BLOCKED_REPLY, _DIRECT_REPLY_SOURCE
+        return None
+
+    def _recent_history(self, conversation_id: str) -> list[_Turn]:
+        """返回会话未过期的最近几轮对话，按时间先后排列"""
+        turns = self._recent_turns.get(conversation_id)
+        if not turns:
+            return []
+        deadline = time.monotonic() - RECENT_TURN_TTL
+        while turns and turns[0].timestamp < deadline:
+            turns.popleft()
+        if not turns:
+            del self._recent_turns[conversation_id]
+            return []
+        return list(turns)
+
+    def _record_turn(self, conversation_id: str, question: str, reply: str, via_team: bool) -> None:
+        """记录会话中已处理的一轮对话"""
+        turns = self._recent_turns.pop(conversation_id, None)
+        if turns is None:
+            turns = deque(maxlen=MAX_RECENT_TURNS)
+        turns.append(_Turn(question, reply, via_team, time.monotonic()))
+        self._recent_turns[conversation_id] = turns
+        while len(self._recent_turns) > MAX_CONVERSATION_STATES:
+            self._recent_turns.popitem(last=False)
 
     async def _search_knowledge_base_tool(self, query: str, n_results: int = 3) -> str:
         """知识库检索工具（薄封装，实际逻辑在 tools.knowledge_base）"""
@@ -79,8 +452,8 @@ class AIMessageHandler:
         """JIRA 请求工具（薄封装，实际逻辑在 tools.jira）"""
         return await process_jira_request(
             request_text,
-            sender_id=self._current_sender_id or "unknown_sender",
-            conversation_id=self._current_conversation_id or "unknown_conversation",
+            sender_id=_sender_id.get(),
+            conversation_id=_conversation_id.get(),
         )
 
     async def _process_ssh_request_tool(
@@ -100,8 +473,8 @@ class AIMessageHandler:
                 request_text,
                 target_host,
                 mode=mode,
-                sender_id=self._current_sender_id or "unknown_sender",
-                conversation_id=self._current_conversation_id or "unknown_conversation",
+                sender_id=_sender_id.get(),
+                conversation_id=_conversation_id.get(),
             )
         except Exception as e:  # noqa: BLE001
             logger.error(f"SSH请求工具调用失败: {e}")
@@ -153,216 +526,397 @@ class AIMessageHandler:
             logger.error(f"天气查询工具调用失败: {e}")
             return f"❌ 无法获取天气信息: {e}"
 
-    def _init_agents_and_groupchat(self):
-        """初始化智能体和 SelectorGroupChat"""
+    # 智能体与 SelectorGroupChat 在首次处理消息时才创建，服务启动阶段不再构建；
+    # AssistantAgent 会在 model_context 中保留历史，团队成员与关键词直达的智能体各自独立构建，互不共享
 
-        self.knowledge_expert_agent = AssistantAgent(
+    def _build_knowledge_expert_agent(self) -> AssistantAgent:
+        """知识库专家"""
+        return AssistantAgent(
             name="KnowledgeExpert",
-            system_message="""你是一个知识库专家。如果用户的问题需要从知识库中查找答案，请调用`search_knowledge_base`工具，并使用用户原始提问作为查询参数。
-
-            **重要的回复格式要求：**
-            1. 必须先调用知识库工具获取搜索结果
-            2. 根据工具返回的结果回答用户问题
-            3. 如果工具未返回有效信息，请告知用户知识库中没有相关内容
-            4. 最后在回复末尾添加'TERMINATE'
-
-            绝对不要只返回'TERMINATE'而不包含搜索结果或回答！""",
+            system_message=_SM_KNOWLEDGE,
             description="知识库专家：当用户提问公司产品、文档、政策或历史数据等需要查阅内部资料的问题时，选择我。我会使用知识库工具查找答案。",
             model_client=self.model_client,
+            model_client_stream=STREAM_REPLIES,
             memory=[
                 self.shared_vector_memory
             ],  # Use shared vector memory as list per autogen v0.6 API
         )
 
-        self.server_admin_agent = AssistantAgent(
+    def _build_server_admin_agent(self) -> AssistantAgent:
+        """服务器管理专家"""
+        return AssistantAgent(
             name="ServerAdmin",
-            system_message="""你是一个服务器管理专家。负责处理服务器操作、Dify服务管理、SSH连接、日志分析等问题。
-
-            当用户请求涉及以下内容时，必须调用`_process_ssh_request_tool`工具：
-            1. 查看服务器状态（磁盘、内存、进程等）
-            2. 需要操作服务器，执行相关的服务器命令的时候
-            3. Dify服务升级或维护
-
-            工具参数说明：
-            - request_text: 用户原始请求文本
-            - host: 目标主机地址（默认传空）
-            - mode: 操作模式 (free/upgrade)
-
-            特别注意：
-            - 对于明确的Dify升级请求，必须使用mode='upgrade'
-            - 其他SSH操作使用mode='free'
-            - 不要直接给出建议，必须调用工具获取实际执行结果
-
-            **重要的回复格式要求：**
-            1. 必须先调用SSH工具获取执行结果
-            2. 对工具返回的内容进行归纳整理
-            3. 最后部分添加TERMINATE
-
-            绝对不要只返回'TERMINATE'而不包含工具执行结果！
-            绝对不要使用占位符文本如'[SSH工具返回的完整结果]'！""",
+            system_message=_SM_SERVER,
             description="服务器管理专家：当用户咨询服务器维护、Dify平台管理、SSH操作或日志分析等技术问题时，选择我。我会实际执行相关命令。",
             model_client=self.model_client,
+            model_client_stream=STREAM_REPLIES,
             tools=[self._process_ssh_request_tool],
         )
 
-        self.jira_specialist_agent = AssistantAgent(
+    def _build_jira_specialist_agent(self) -> AssistantAgent:
+        """JIRA任务专家"""
+        return AssistantAgent(
             name="JiraSpecialist",
-            system_message="""你是一个JIRA任务专家。如果用户想要创建JIRA工单/任务，请调用`_process_jira_request_tool`工具，并将用户的完整原始请求作为参数。
-
-            **重要的回复格式要求：**
-            1. 必须先调用JIRA工具处理用户请求
-            2. 将工具返回的完整结果作为你的回复内容
-            3. 不要省略或修改工具返回的任何信息
-            4. 无论工具调用成功或失败，都要包含完整的工具信息
-            5. 最后在回复末尾添加'TERMINATE'
-
-            绝对不要只返回'TERMINATE'而不包含工具执行结果！""",
+            system_message=_SM_JIRA,
             tools=[self._process_jira_request_tool],
             description="JIRA任务专家：当用户的请求明确涉及JIRA、创建工单时，选择我。我会使用JIRA工具处理请求。",
             model_client=self.model_client,
+            model_client_stream=STREAM_REPLIES,
         )
 
-        self.sql_expert_agent = AssistantAgent(
+    def _build_sql_expert_agent(self) -> AssistantAgent:
+        """数据库查询专家"""
+        return AssistantAgent(
             name="SQLExpert",
-            system_message="""你是一个数据库查询专家，能够将中文自然语言问题转换为SQL并查询本地数据库。
-            当且仅当用户的问题涉及数据库检索、数据统计或者明显需要查询本地数据时
-            调用`_process_sql_query_tool`工具。
-            工具参数说明：
-            - nl_text: 要检索查询的问题。例如，"当前数据库有哪些用户？"
-                **重要的回复格式要求：**
-                1. 需要检索查询时，必须先调用SQL工具获取查询结果
-                2. 根据工具返回的结果进行简要解释或总结
-                3. 最后在回复末尾添加'TERMINATE'
-
-            绝对不要只返回'TERMINATE'而不包含查询结果！""",
+            system_message=_SM_SQL,
             description="数据库专家：当用户需要查询本地数据库信息或数据统计时，选择我。",
             model_client=self.model_client,
+            model_client_stream=STREAM_REPLIES,
             tools=[self._process_sql_query_tool],
         )
 
-        self.general_assistant_agent = AssistantAgent(
+    def _build_general_assistant_agent(self) -> AssistantAgent:
+        """通用助手"""
+        return AssistantAgent(
             name="GeneralAssistant",
-            system_message="""
-            你是一个通用的AI助手。负责回答引导用户，或进行闲聊，查看天气等等。
-            你可以告诉用户你会什么技能包括：
-            1. 服务器管理
-            ```
-             dify服务重启
-             dify服务自动化升级
-             系统运行状态查询
-             天气查询、支持、当前、近七天、支持历史查询
-            ```
-            2. 本地数据库的查询和分析
-            3. JIRA需求提单：告诉用户提单格式要求：
-            ```
-                配置jira信息
-                **用户名**: `your_jira_username`
-                **密码**: `your_jira_password`
-
-            ```
-            格式要求：
-            ```
-            1. 需求描述中最好包含客户名称的相关信息
-            2. 不限制内容，但要确保信息基本可用
-            3. 默认批量提单，如果不需要批量，请在描述中体现
-            ```
-            ---
-            你的回答尽量整理成一个标准markdown格式的文档，语言风趣幽默。按照回复、需求、问题、建议等不同的场景，支持多种丰富的markdown语法，如：
-            ```
-            1. **加粗**
-            2. *斜体*
-            3. `代码`
-            4. [链接](https://www.example.com)
-            5. ![图片](https://www.example.com/image.png)
-            6. 表格
-            7. 列表
-            8. mermaid图表
-            9. 互联网风格icon
-            ```
-            如果你的得到的信息有来源，请标明来源。
-
-            回答完毕后，请以'TERMINATE'结束你的回复。
-            """,
+            system_message=_SM_GENERAL,
             description="通用助手：对于日常对话、一般性问题，天气问题选择我。",
             model_client=self.model_client,
+            model_client_stream=STREAM_REPLIES,
             tools=[self._process_weather_request_tool],
         )
 
+    def _build_team(self) -> SelectorGroupChat:
+        """按用户请求路由到单个智能体的 SelectorGroupChat，每个团队实例使用各自的智能体"""
         selectable_agents = [
-            self.sql_expert_agent,
-            self.knowledge_expert_agent,
-            self.server_admin_agent,
-            self.jira_specialist_agent,
-            self.general_assistant_agent,
+            self._build_sql_expert_agent(),
+            self._build_knowledge_expert_agent(),
+            self._build_server_admin_agent(),
+            self._build_jira_specialist_agent(),
+            self._build_general_assistant_agent(),
         ]
 
-        text_mention_termination = TextMentionTermination("TERMINATE")
+        self._participant_names = frozenset(agent.name for agent in selectable_agents)
+
+        text_mention_termination = TextMentionTermination(_TERMINATE)
         max_messages_termination = MaxMessageTermination(max_messages=25)
 
-        self.groupchat = SelectorGroupChat(
+        return SelectorGroupChat(
             participants=selectable_agents,
-            selector_prompt=SELECTOR_PROMPT_ZH,
-            model_client=self.model_client,
+            selector_func=self._cached_selection,
+            selector_prompt=_render_selector_prompt(selectable_agents),
+            # 选择器只需输出一个智能体名称，使用更快更便宜的模型并限制输出长度
+            model_client=get_openai_client(
+                model=SELECTOR_MODEL, max_tokens=16, model_info={"json_output": False}
+            ),
             allow_repeated_speaker=True,
             termination_condition=text_mention_termination | max_messages_termination,
         )
 
-    async def process_message(
-        self, text: str, sender_id: str, conversation_id: str
-    ) -> Optional[str]:
-        """使用SelectorGroupChat处理传入的消息"""
-        logger.info(f"AIMessageHandler 收到消息 from {sender_id}: {text}")
-        self._current_sender_id = sender_id
-        self._current_conversation_id = conversation_id
+    @cached_property
+    def router_tools(self) -> dict[str, Tuple[FunctionTool, str]]:
+        """路由模型可直接调用的工具：工具名 -> (工具, 对应的智能体名称)"""
+        tools = [
+            (
+                FunctionTool(
+                    self._search_knowledge_base_tool,
+                    name=_KNOWLEDGE_TOOL,
+                    description="检索公司内部知识库，查找产品、文档、政策或历史数据等内部资料",
+                ),
+                "KnowledgeExpert",
+            ),
+            (
+                FunctionTool(
+                    self._process_jira_request_tool,
+                    name="process_jira_request",
+                    description="处理JIRA相关请求，如批量创建工单、配置JIRA账号",
+                ),
+                "JiraSpecialist",
+            ),
+            (
+                FunctionTool(
+                    self._process_ssh_request_tool,
+                    name="process_ssh_request",
+                    description=(
+                        "在服务器上执行运维操作，如重启或升级Dify服务、查询系统运行状态。"
+                        "mode 取值：明确的Dify升级请求必须使用 'upgrade'，其他操作使用 'free'；"
+                        "host 未指定时留空使用默认服务器"
+                    ),
+                ),
+                "ServerAdmin",
+            ),
+            (
+                FunctionTool(
+                    self._process_sql_query_tool,
+                    name="process_sql_query",
+                    description="用自然语言查询本地数据库，返回查询与统计结果",
+                ),
+                "SQLExpert",
+            ),
+            (
+                FunctionTool(
+                    self._process_weather_request_tool,
+                    name="process_weather_request",
+                    description="查询指定城市的当前、分钟级、小时级、日级或历史天气",
+                ),
+                "GeneralAssistant",
+            ),
+        ]
+        return {tool.name: (tool, agent_name) for tool, agent_name in tools}
 
-        # 记录开始时间用于计算响应时间
-        start_time = time.time()
-        final_reply = "抱歉，处理您的请求时出现了问题，未能获取明确回复。"
-        agent_type = None
+    async def _route_with_tools(
+        self,
+        text: str,
+        history: Sequence[_Turn] = (),
+        stream_callback: Optional[StreamCallback] = None,
+    ) -> Optional[BaseChatMessage]:
+        """
+        一次模型调用完成路由：模型直接调用动作类工具或直接作答，省去选择器和智能体两次调用
 
+        history 中的最近几轮对话放在当前消息之前，模型据此理解追问。
+        模型选择 transfer_to_team、同时调用多个工具或参数无法解析时返回 None，由 SelectorGroupChat 处理
+        """
+        messages: list = [SystemMessage(content=_SM_ROUTER)]
+        for turn in history:
+            messages.append(UserMessage(content=turn.question, source="user"))
+            messages.append(AssistantMessage(content=turn.reply, source=_HISTORY_REPLY_SOURCE))
+        messages.append(UserMessage(content=text, source="user"))
+        tool_schemas = [tool.schema for tool, _ in self.router_tools.values()]
+        tool_schemas.append(_TRANSFER_TO_TEAM_SCHEMA)
+        result = await self._create(messages, tool_schemas, stream_callback)
+
+        if result is None or not result.content:
+            return None
+        if isinstance(result.content, str):
+            return TextMessage(content=result.content, source=_ROUTER_DIRECT_SOURCE)
+
+        if len(result.content) != 1 or result.content[0].name not in self.router_tools:
+            return None
+        call = result.content[0]
         try:
-            team = self.groupchat
+            arguments = json.loads(call.arguments or "{}")
+        except json.JSONDecodeError:
+            logger.warning(f"路由模型返回的工具参数无法解析: {call.arguments}")
+            return None
+
+        tool, agent_name = self.router_tools[call.name]
+        logger.info(f"路由模型直接调用工具: {call.name}")
+        output = tool.return_value_as_string(await tool.run_json(arguments, CancellationToken()))
+        if call.name != _KNOWLEDGE_TOOL:
+            return TextMessage(content=output, source=agent_name)
+
+        # 知识库检索结果需要再由模型整理成回答
+        answer = await self._create(
+            [
+                SystemMessage(content=_SM_KNOWLEDGE_ANSWER),
+                UserMessage(content=f"知识库检索结果：\n{output}\n\n用户问题：{text}", source="user"),
+            ],
+            [],
+            stream_callback,
+        )
+        if answer is None or not isinstance(answer.content, str) or not answer.content:
+            return None
+        return TextMessage(content=answer.content, source=agent_name)
 
-            # result = await Console(team.run_stream(task=text))
+    async def _create(
+        self,
+        messages: list,
+        tools: list,
+        stream_callback: Optional[StreamCallback] = None,
+    ) -> Optional[CreateResult]:
+        """调用模型；有 stream_callback 时以流式方式调用并转发文本片段"""
+        if stream_callback is None:
+            return await self.model_client.create(messages, tools=tools)
+        result = None
+        async for item in self.model_client.create_stream(messages, tools=tools):
+            if isinstance(item, str):
+                await stream_callback(item)
+            else:
+                result = item
+        return result
 
-            # result = await team.run(task=text)
+    def _cached_selection(self, thread: Sequence[BaseAgentEvent | BaseChatMessage]) -> Optional[str]:
+        """
+        SelectorGroupChat 的 selector_func：轮到为会话的第一条用户消息选择智能体时，
+        相同提问直接复用上次的选择结果，跳过选择器的模型调用；其余情况返回 None 交给模型选择
 
-            result = TaskResult(messages=[])
+        有对话历史时选择结果依赖上下文（如“继续”“好的”），不复用缓存。
+        """
+        if not thread:
+            return None
+        last = thread[-1]
+        if not isinstance(last, TextMessage) or last.source != "user":
+            return None
+        if any(isinstance(message, TextMessage) and message.source == "user" for message in thread[:-1]):
+            return None
+        return self._selection_cache.get(_reply_cache_key(last.content))
+
+    def _route_by_keywords(self, text: str) -> Optional[AssistantAgent]:
+        """
+        只命中一类关键词时返回新构建的对应智能体，未命中或命中多类时返回 None，交由选择器判断
 
-            async for message in team.run_stream(task=text):
-                result.messages.append(message)
+        每次直达都使用全新的智能体，对话历史不会在不同用户、不同会话之间串用，
+        也不会与正在运行的团队成员争用同一个对象。
+        """
+        matched = _matched_routes(text)
+        if len(matched) != 1:
+            return None
+        return getattr(self, f"_build_{matched.pop()}")()
+
+    @asynccontextmanager
+    async def _acquire_team(self) -> AsyncIterator[SelectorGroupChat]:
+        """从团队池取出一个空闲团队，池未满时新建，用完放回"""
+        if self._team_pool.empty() and self._team_count < MAX_CONCURRENT_TEAMS:
+            self._team_count += 1
+            team = self._build_team()
+        else:
+            team = await self._team_pool.get()
+        try:
+            yield team
+        finally:
+            self._team_pool.put_nowait(team)
 
-            if not result or not hasattr(result, "messages") or not result.messages:
-                logger.error("SelectorGroupChat: 团队处理失败或未返回任何消息。")
-                return "抱歉，处理您的请求时出现了问题，未能获取明确回复。"
+    async def _run_groupchat(
+        self,
+        text: str,
+        history: Sequence[_Turn] = (),
+        stream_callback: Optional[StreamCallback] = None,
+    ):
+        """
+        由 SelectorGroupChat 选择智能体处理消息，返回最后一条消息
 
-            # result.messages[-1] 被理解为一个容器对象
-            # 这个容器对象的字符串表示形式与INFO日志中的 "messages=[...] stop_reason=..." 相符
-            final_reply_container = result.messages[-1]
+        上一轮也由团队处理时恢复团队状态继续对话；中间有其他路径处理的轮次时，
+        团队状态已过时，改为从干净状态开始，并把 history 中的最近几轮作为任务的一部分交给团队。
+        """
+        # 只保留最后一条消息，不再缓存整个对话过程；
+        # TERMINATE 由团队的终止条件识别并结束本轮运行，不在此处中断迭代，以免团队停留在运行状态
+        conversation_id = _conversation_id.get()
+        final_message = None
+        lock = self._conversation_locks.get(conversation_id)
+        if lock is None:
+            lock = self._conversation_locks[conversation_id] = asyncio.Lock()
+        # 同一会话串行处理；不同会话各取一个团队实例并发运行
+        async with lock, self._acquire_team() as team:
+            # 同一会话的后续消息恢复上次的团队状态（对话历史、选择器上下文），新会话从干净状态开始
+            state = self._conversation_states.pop(conversation_id, None)
+            resume = state is not None and bool(history) and history[-1].via_team
+            task: str | list[BaseChatMessage] = text
+            if resume:
+                await team.load_state(state)
+            else:
+                await team.reset()
+                if history:
+                    task = _history_messages(history) + [TextMessage(content=text, source="user")]
+
+            selected = None
+            # run_stream 会先原样返回任务消息，回放的历史消息不计入本轮结果
+            skip = len(task) if isinstance(task, list) else 0
+            async for message in team.run_stream(task=task):
+                if skip:
+                    skip -= 1
+                    continue
+                if isinstance(message, TaskResult):
+                    if message.messages:
+                        final_message = message.messages[-1]
+                elif isinstance(message, ModelClientStreamingChunkEvent):
+                    if stream_callback is not None:
+                        await stream_callback(message.content)
+                else:
+                    final_message = message
+                    # 第一个发言的参与者即本次选择结果，记录下来供相同提问复用
+                    if selected is None and message.source in self._participant_names:
+                        selected = message.source
+            # 只缓存新会话第一轮的选择，追问的选择依赖上下文
+            if selected is not None and not history:
+                self._selection_cache.set(_reply_cache_key(text), selected)
+
+            self._conversation_states[conversation_id] = _trim_team_state(await team.save_state())
+            while len(self._conversation_states) > MAX_CONVERSATION_STATES:
+                self._conversation_states.popitem(last=False)
+        return final_message
 
-            # 记录一下这个容器对象，以便调试确认
-            # logger.info(f"SelectorGroupChat 最终回复容器对象: {final_reply_container}")
+    async def process_message(
+        self,
+        text: str,
+        sender_id: str,
+        conversation_id: str,
+        stream_callback: Optional[StreamCallback] = None,
+    ) -> Optional[str]:
+        """
+        使用SelectorGroupChat处理传入的消息
 
-            actual_final_message = None
-            # 从容器中提取真正的最后一条消息
-            if (
-                hasattr(final_reply_container, "messages")
-                and isinstance(final_reply_container, TaskResult)
-                and final_reply_container.messages
-            ):
-                actual_final_message = final_reply_container.messages[-1]
-                logger.info(f"SelectorGroupChat 从容器提取的实际最终消息: {actual_final_message}")
+        stream_callback 不为空且启用了流式输出时，模型生成的文本片段会按顺序传给它；
+        返回值仍为完整的最终回复。
+        """
+        logger.info(f"AIMessageHandler 收到消息 from {sender_id}: {text}")
+        # 按任务隔离当前会话信息，并发处理多条消息时工具读取到的始终是本条消息的发送者
+        sender_token = _sender_id.set(sender_id or "unknown_sender")
+        conversation_token = _conversation_id.set(conversation_id or "unknown_conversation")
+
+        # 记录开始时间用于计算响应时间
+        start_time = time.time()
+        final_reply = "抱歉，处理您的请求时出现了问题，未能获取明确回复。"
+        agent_type = None
+
+        try:
+            # 空消息、寒暄、重复发送等请求直接回复，不经过任何模型调用
+            direct = self._try_direct_reply(text, sender_id, _conversation_id.get())
+            if direct is not None:
+                final_reply, agent_type = direct
+                logger.info(f"AIMessageHandler 直接回复: {agent_type}")
+                return final_reply
+
+            # 已有对话历史的会话中，回复依赖上下文，不读写回复缓存
+            history = self._recent_history(_conversation_id.get())
+            has_history = bool(history)
+            # 同一会话短时间内的相同提问直接返回上次回复，不再调用模型
+            cache_key = (_conversation_id.get(), _reply_cache_key(text))
+            cached = None if has_history else self._reply_cache.get(cache_key)
+            if cached is not None:
+                final_reply, agent_type = cached
+                logger.info(f"AIMessageHandler 命中回复缓存: {agent_type}")
+                self._record_turn(_conversation_id.get(), text, final_reply, via_team=False)
+                return final_reply
+
+            via_team = False
+            routed_agent = self._route_by_keywords(text)
+            if routed_agent is not None:
+                # 意图明确时直接调用目标智能体，省去一次选择器的模型调用
+                logger.info(f"关键词直达智能体: {routed_agent.name}")
+                actual_final_message = None
+                async for event in routed_agent.on_messages_stream(
+                    _history_messages(history) + [TextMessage(content=text, source="user")],
+                    CancellationToken(),
+                ):
+                    if isinstance(event, Response):
+                        actual_final_message = event.chat_message
+                    elif isinstance(event, ModelClientStreamingChunkEvent) and stream_callback is not None:
+                        await stream_callback(event.content)
             else:
-                # 如果容器结构不符合预期，或者没有消息，则记录错误
-                logger.error(
-                    f"SelectorGroupChat: 最终回复容器对象结构不符合预期或其消息列表为空. 类型: {type(final_reply_container)}"
+                actual_final_message = None
+                # 上一轮由团队处理时，追问继续交给团队，以保留团队内的多轮上下文；
+                # 其余消息带上最近几轮对话先走单次路由
+                team_follow_up = (
+                    has_history
+                    and history[-1].via_team
+                    and _conversation_id.get() in self._conversation_states
+                    and _is_follow_up(text)
                 )
-                return "抱歉，处理您的请求时出现了问题，未能获取最终回复。"
+                if not team_follow_up:
+                    actual_final_message = await self._route_with_tools(text, history, stream_callback)
+                if actual_final_message is None:
+                    via_team = True
+                    actual_final_message = await self._run_groupchat(text, history, stream_callback)
+
+            if actual_final_message is None:
+                logger.error("SelectorGroupChat: 团队处理失败或未返回任何消息。")
+                return "抱歉，处理您的请求时出现了问题，未能获取明确回复。"
+            logger.info(f"SelectorGroupChat 实际最终消息: {actual_final_message}")
 
-            # 现在，actual_final_message 应该是我们期望的 TextMessage 对象
+            # 现在，actual_final_message 应该是 TextMessage，直达智能体未做总结时为工具结果摘要
             # 对它进行验证
             if (
-                not isinstance(actual_final_message, TextMessage)
+                not isinstance(actual_final_message, (TextMessage, ToolCallSummaryMessage))
                 or not actual_final_message.content
             ):
                 logger.error(
@@ -373,8 +927,10 @@ class AIMessageHandler:
 
             # 使用提取出来的实际消息内容
             final_reply_content = actual_final_message.content
-            if final_reply_content and "TERMINATE" in final_reply_content:
-                final_reply_content = final_reply_content.replace("TERMINATE", "").strip()
+            # 系统提示词要求 TERMINATE 位于回复末尾，只去掉结尾标记，保留正文中的同名文字
+            final_reply_content = final_reply_content.rstrip()
+            if final_reply_content.endswith(_TERMINATE):
+                final_reply_content = final_reply_content[: -len(_TERMINATE)].rstrip()
 
             if not final_reply_content or final_reply_content.lower() == "none":
                 final_reply_content = "已处理您的请求，但未生成明确的文本回复。"
@@ -385,6 +941,14 @@ class AIMessageHandler:
             if hasattr(actual_final_message, 'source'):
                 agent_type = actual_final_message.source
 
+            if agent_type in _CACHEABLE_AGENTS and not has_history and not _is_stateful_request(text):
+                self._reply_cache.set(cache_key, (final_reply, agent_type))
+            if not _is_follow_up(text):
+                self._recent_replies.set(
+                    _duplicate_key(text, sender_id, _conversation_id.get()), (final_reply, agent_type)
+                )
+            self._record_turn(_conversation_id.get(), text, final_reply, via_team)
+
         except Exception as e:
             logger.error(f"处理消息时发生异常: {e}", exc_info=True)
             final_reply = f"抱歉，处理您的请求时发生错误: {e}"
@@ -396,7 +960,7 @@ class AIMessageHandler:
 
             # 保存对话记录到数据库
             try:
-                record_id = save_conversation_record(
+                record_id = await asave_conversation_record(
                     conversation_id=conversation_id,
                     sender_id=sender_id,
                     user_question=text,
@@ -409,8 +973,8 @@ class AIMessageHandler:
             except Exception as e:
                 logger.error(f"保存对话记录失败: {e}")
 
-            self._current_sender_id = None
-            self._current_conversation_id = None
+            _sender_id.reset(sender_token)
+            _conversation_id.reset(conversation_token)
 
         logger.info(f"AIMessageHandler 回复: {final_reply}")
         return final_reply
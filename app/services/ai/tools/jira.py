@@ -9,24 +9,9 @@ from typing import Any, Dict
 
 from loguru import logger
 
-# 延迟导入避免循环依赖
-
 __all__ = ["process_jira_request"]
 
 
-# 复用单例，避免频繁初始化
-_jira_agent = None
-
-
-def _get_agent():
-    global _jira_agent  # noqa: PLW0603
-    if _jira_agent is None:
-        # 延迟导入避免循环依赖
-        from app.services.ai.agent.jira_batch_agent import JiraBatchAgent
-        _jira_agent = JiraBatchAgent()
-    return _jira_agent
-
-
 async def process_jira_request(
     request_text: str,
     sender_id: str = "unknown_sender",
@@ -40,7 +25,10 @@ async def process_jira_request(
         "sender_id": sender_id,
         "conversation_id": conversation_id,
     }
-    agent = _get_agent()
+    # 延迟导入避免循环依赖
+    from app.services.ai.agent.jira_batch_agent import get_jira_batch_agent
+
+    agent = get_jira_batch_agent()
     response = await agent.process(message_payload)
 
     if isinstance(response, dict) and "content" in response:
@@ -5,35 +5,26 @@
 """
 from __future__ import annotations
 
-import asyncio
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 
 from loguru import logger
-from autogen_ext.memory.chromadb import ChromaDBVectorMemory
-
-__all__ = ["search_knowledge_base"]
+from autogen_core.memory import MemoryContent
 
+if TYPE_CHECKING:
+    # chromadb 依赖较重，仅用于类型注解
+    from autogen_ext.memory.chromadb import ChromaDBVectorMemory
 
-async def _retrieve(vector_memory: ChromaDBVectorMemory, query: str, n_results: int):
-    """包装同步的 `retrieve_docs`，在线程池中运行。"""
-    return await asyncio.to_thread(
-        vector_memory.retrieve_docs,
-        query_texts=[query],
-        n_results=n_results,
-    )
+__all__ = ["search_knowledge_base"]
 
 
-def _format_docs(retrieved_docs_dict) -> str:
-    processed: List[str] = []
-    if not retrieved_docs_dict or not retrieved_docs_dict.get("documents"):
+def _format_docs(contents: List[MemoryContent]) -> str:
+    if not contents:
         return "未在知识库中找到相关信息。"
 
-    docs_for_query = retrieved_docs_dict["documents"][0]
-    metadatas = retrieved_docs_dict.get("metadatas", [[]])[0]
-
-    for i, doc in enumerate(docs_for_query):
-        source = metadatas[i].get("source", "未知来源") if i < len(metadatas) else "未知来源"
-        processed.append(f"来源: {source}\n内容: {doc}")
+    processed: List[str] = []
+    for item in contents:
+        source = (item.metadata or {}).get("source", "未知来源")
+        processed.append(f"来源: {source}\n内容: {item.content}")
     return "\n\n---\n\n".join(processed)
 
 
@@ -50,8 +41,9 @@ async def search_knowledge_base(
         return "知识库未正确配置或初始化，无法执行搜索。"
 
     try:
-        docs_dict = await _retrieve(vector_memory, query, n_results)
-        return _format_docs(docs_dict)
+        # ChromaDBVectorMemory 没有 retrieve_docs，使用其原生的异步 query 接口，与 KnowledgeRetriever.search 一致
+        result = await vector_memory.query(query)
+        return _format_docs(result.results[:n_results])
     except Exception as exc:  # noqa: BLE001
         logger.error(f"KnowledgeBase 检索失败: {exc}")
         return f"知识库检索时发生错误: {exc}"
@@ -116,30 +116,25 @@ class WeeklyReportAgent:
             # 查找最终的周报总结（优先使用Reviewer的输出，其次是Summarizer的输出）
             final_summary = None
 
-            # 首先查找Reviewer的最后一个有效输出
+            # 单次逆序遍历：遇到Reviewer的有效输出即停止，同时记下最后一个Summarizer输出作为备选
+            summarizer_summary = None
             for message in reversed(messages):
-                if (
-                    isinstance(message, TextMessage)
-                    and message.source == "Reviewer"
-                    and message.content.strip()
-                    and not message.content.strip().upper().startswith("TERMINATE")
-                ):
-                    final_summary = message.content.strip()
+                if not isinstance(message, TextMessage) or message.source not in ("Reviewer", "Summarizer"):
+                    continue
+                content = message.content.strip()
+                if not content or content.upper().startswith("TERMINATE"):
+                    continue
+                if message.source == "Reviewer":
+                    final_summary = content
                     logger.info("使用Reviewer审查后的周报总结")
                     break
+                if summarizer_summary is None:
+                    summarizer_summary = content
 
             # 如果没有找到Reviewer的有效输出，使用Summarizer的最后输出
-            if not final_summary:
-                for message in reversed(messages):
-                    if (
-                        isinstance(message, TextMessage)
-                        and message.source == "Summarizer"
-                        and message.content.strip()
-                        and not message.content.strip().upper().startswith("TERMINATE")
-                    ):
-                        final_summary = message.content.strip()
-                        logger.info("使用Summarizer的周报总结")
-                        break
+            if not final_summary and summarizer_summary:
+                final_summary = summarizer_summary
+                logger.info("使用Summarizer的周报总结")
 
             if final_summary:
                 # 清理可能的markdown代码块标记
@@ -6,19 +6,20 @@
 提供对话记录的查询、统计、清理等功能
 """
 
-
-import asyncio
 import csv
 import io
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple, Union
 
+from app.utils.async_utils import run_blocking
 from app.utils.time_utils import get_beijing_time_str, get_beijing_date_days_ago
 
 from loguru import logger
 
 from app.db_utils import (
-    get_conn,
+    count_conversation_records_before,
+    delete_conversation_records_before,
+    export_conversation_records,
     save_conversation_record,
     get_conversation_history,
     get_conversation_stats
@@ -54,7 +55,7 @@ class ConversationLogService:
         """
         try:
             # 使用线程池执行数据库操作
-            record_id = await asyncio.to_thread(
+            record_id = await run_blocking(
                 save_conversation_record,
                 conversation_id,
                 sender_id,
@@ -90,7 +91,7 @@ class ConversationLogService:
         """
         try:
             # 使用线程池执行数据库操作
-            history = await asyncio.to_thread(
+            history = await run_blocking(
                 get_conversation_history,
                 conversation_id,
                 sender_id,
@@ -141,7 +142,7 @@ class ConversationLogService:
             start_date = get_beijing_date_days_ago(days)
 
             # 使用线程池执行数据库操作
-            stats = await asyncio.to_thread(
+            stats = await run_blocking(
                 get_conversation_stats,
                 conversation_id,
                 sender_id,
@@ -168,20 +169,8 @@ class ConversationLogService:
             # 计算截止日期（北京时间）
             cutoff_date = get_beijing_date_days_ago(days)
 
-            # 执行查询操作
-            def _count_old_records():
-                conn = get_conn()
-                cursor = conn.execute(
-                    """SELECT COUNT(*) FROM conversation_records
-                       WHERE date(created_at) < date(?)""",
-                    (cutoff_date,)
-                )
-                count = cursor.fetchone()[0]
-                conn.close()
-                return count
-
             # 使用线程池执行数据库操作
-            count = await asyncio.to_thread(_count_old_records)
+            count = await run_blocking(count_conversation_records_before, cutoff_date)
             return count
         except Exception as e:
             logger.error(f"统计对话记录失败: {e}")
@@ -201,21 +190,8 @@ class ConversationLogService:
             # 计算截止日期（北京时间）
             cutoff_date = get_beijing_date_days_ago(days)
 
-            # 执行删除操作
-            def _delete_old_records():
-                conn = get_conn()
-                cursor = conn.execute(
-                    """DELETE FROM conversation_records
-                       WHERE date(created_at) < date(?)""",
-                    (cutoff_date,)
-                )
-                deleted_count = cursor.rowcount
-                conn.commit()
-                conn.close()
-                return deleted_count
-
             # 使用线程池执行数据库操作
-            deleted_count = await asyncio.to_thread(_delete_old_records)
+            deleted_count = await run_blocking(delete_conversation_records_before, cutoff_date)
 
             logger.info(f"已清理 {deleted_count} 条 {cutoff_date} 之前的对话记录")
             return {
@@ -259,44 +235,10 @@ class ConversationLogService:
             if not start_date:
                 start_date = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
 
-            # 构建SQL查询
-            def _export_records():
-                conn = get_conn()
-                query = """SELECT * FROM conversation_records WHERE 1=1"""
-                params = []
-
-                if start_date:
-                    query += " AND date(created_at) >= date(?)"
-                    params.append(start_date)
-
-                if end_date:
-                    query += " AND date(created_at) <= date(?)"
-                    params.append(end_date)
-
-                if conversation_id:
-                    query += " AND conversation_id = ?"
-                    params.append(conversation_id)
-
-                if sender_id:
-                    query += " AND sender_id = ?"
-                    params.append(sender_id)
-
-                query += " ORDER BY created_at DESC"
-
-                cursor = conn.execute(query, params)
-                columns = [description[0] for description in cursor.description]
-                records = cursor.fetchall()
-                conn.close()
-
-                # 转换为字典列表
-                result = []
-                for record in records:
-                    result.append(dict(zip(columns, record)))
-
-                return result
-
             # 使用线程池执行数据库操作
-            records = await asyncio.to_thread(_export_records)
+            records = await run_blocking(
+                export_conversation_records, start_date, end_date, conversation_id, sender_id
+            )
 
             # 根据格式返回结果
             if format.lower() == "csv":
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+钉钉 AI 卡片流式回复：先投放一张空卡片，模型生成过程中持续刷新卡片正文
+"""
+
+import time
+import uuid
+from typing import TYPE_CHECKING, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+from app.utils.async_utils import run_blocking
+
+if TYPE_CHECKING:
+    from app.core.dingtalk_client import DingTalkClient
+
+# 两次刷新卡片之间的最小间隔（秒），避免每个文本片段都调用一次接口
+STREAM_UPDATE_INTERVAL = 0.3
+
+
+class AICardReplier:
+    """
+    以 AI 卡片流式回复一条消息
+
+    用法：start() 投放卡片成功后，把模型输出的文本片段依次交给 append()，
+    结束时调用 finish() 写入完整回复并关闭流式状态。
+    """
+
+    def __init__(self, client: "DingTalkClient", conversation_id: str, sender_id: str, is_group_chat: bool):
+        self.client = client
+        self.conversation_id = conversation_id
+        self.sender_id = sender_id
+        self.is_group_chat = is_group_chat
+        self.out_track_id = uuid.uuid4().hex
+        self._content = ""
+        self._last_flush = 0.0
+        self._card_client = None
+
+    def _get_card_client(self):
+        if self._card_client is None:
+            from alibabacloud_dingtalk.card_1_0.client import Client as DingTalkCardClient
+            from alibabacloud_tea_openapi import models as open_api_models
+
+            config = open_api_models.Config(protocol="https", region_id="central")
+            self._card_client = DingTalkCardClient(config)
+        return self._card_client
+
+    async def _get_token(self) -> Optional[str]:
+        token = await run_blocking(self.client.get_access_token)
+        if not token:
+            logger.error("AI 卡片操作失败: 无法获取访问令牌")
+        return token
+
+    async def start(self) -> bool:
+        """投放一张空的 AI 卡片，成功返回 True"""
+        token = await self._get_token()
+        if not token:
+            return False
+
+        from alibabacloud_dingtalk.card_1_0 import models as card_models
+        from alibabacloud_tea_util import models as util_models
+
+        robot_code = self.client.robot_code
+        request = card_models.CreateAndDeliverRequest(
+            card_template_id=settings.DINGTALK_AI_CARD_TEMPLATE_ID,
+            out_track_id=self.out_track_id,
+            callback_type="STREAM",
+            card_data=card_models.CreateAndDeliverRequestCardData(card_param_map={}),
+        )
+        if self.is_group_chat:
+            request.open_space_id = f"dtv1.card//IM_GROUP.{self.conversation_id}"
+            request.im_group_open_space_model = card_models.CreateAndDeliverRequestImGroupOpenSpaceModel(
+                support_forward=True
+            )
+            request.im_group_open_deliver_model = card_models.CreateAndDeliverRequestImGroupOpenDeliverModel(
+                robot_code=robot_code
+            )
+        else:
+            request.open_space_id = f"dtv1.card//IM_ROBOT.{self.sender_id}"
+            request.im_robot_open_space_model = card_models.CreateAndDeliverRequestImRobotOpenSpaceModel(
+                support_forward=True
+            )
+            request.im_robot_open_deliver_model = card_models.CreateAndDeliverRequestImRobotOpenDeliverModel(
+                space_type="IM_ROBOT", robot_code=robot_code
+            )
+
+        headers = card_models.CreateAndDeliverHeaders(x_acs_dingtalk_access_token=token)
+        try:
+            await self._get_card_client().create_and_deliver_with_options_async(
+                request, headers, util_models.RuntimeOptions()
+            )
+            self._last_flush = time.monotonic()
+            return True
+        except Exception as e:
+            logger.error(f"投放 AI 卡片失败: {e}")
+            return False
+
+    async def _update(self, content: str, finalize: bool = False, error: bool = False) -> bool:
+        token = await self._get_token()
+        if not token:
+            return False
+
+        from alibabacloud_dingtalk.card_1_0 import models as card_models
+        from alibabacloud_tea_util import models as util_models
+
+        request = card_models.StreamingUpdateRequest(
+            out_track_id=self.out_track_id,
+            guid=uuid.uuid4().hex,
+            key=settings.DINGTALK_AI_CARD_CONTENT_KEY,
+            content=content,
+            is_full=True,
+            is_finalize=finalize,
+            is_error=error,
+        )
+        headers = card_models.StreamingUpdateHeaders(x_acs_dingtalk_access_token=token)
+        try:
+            await self._get_card_client().streaming_update_with_options_async(
+                request, headers, util_models.RuntimeOptions()
+            )
+            return True
+        except Exception as e:
+            logger.error(f"刷新 AI 卡片失败: {e}")
+            return False
+
+    async def append(self, chunk: str) -> None:
+        """追加模型输出的文本片段，距上次刷新超过间隔时把累计内容整体写入卡片"""
+        self._content += chunk
+        now = time.monotonic()
+        if now - self._last_flush < STREAM_UPDATE_INTERVAL:
+            return
+        self._last_flush = now
+        await self._update(self._content)
+
+    async def finish(self, content: str) -> bool:
+        """写入完整回复并结束流式状态，失败时返回 False 由调用方改用普通消息发送"""
+        return await self._update(content, finalize=True)
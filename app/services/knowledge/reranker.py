@@ -18,14 +18,16 @@ import os
 import httpx
 from loguru import logger
 
+from app.core.config import settings
+
 DASHSCOPE_ENDPOINT = (
     "https://dashscope.aliyuncs.com/api/v1/services/rerank/text-rerank/text-rerank"
 )
 
 
 async def _get_api_key() -> Optional[str]:
-    """优先从 DASHSCOPE_API_KEY 获取，退回 OPENAI_API_KEY。"""
-    return os.getenv("DASHSCOPE_API_KEY") or os.getenv("OPENAI_API_KEY")
+    """优先从 DASHSCOPE_API_KEY 环境变量获取，退回配置中的 OPENAI_API_KEY。"""
+    return os.getenv("DASHSCOPE_API_KEY") or settings.OPENAI_API_KEY
 
 
 async def rerank_documents(
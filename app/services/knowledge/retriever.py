@@ -195,29 +195,9 @@ class KnowledgeRetriever:
                 logger.error("通义千问API端点未在设置中配置 (TONGYI_EMBEDDING_API_ENDPOINT)。")
                 raise ValueError("通义千问API端点未配置。")
 
-            self.tongyi_embedding_function = TongyiQWenOpenAIEmbeddingFunction(
-                api_key=self.tongyi_api_key,
-                model_name=self.embedding_model_name,
-                base_url=self.tongyi_base_url,
-                dimensions=self.embedding_dimensions,
-            )
-            logger.info("通义千问OpenAI兼容嵌入函数已创建。")
-
-            if self.persistence_path:
-                os.makedirs(self.persistence_path, exist_ok=True)
-                logger.info(f"持久化路径 '{self.persistence_path}' 已确认/创建。")
-
-            chroma_config = PersistentChromaDBVectorMemoryConfig(
-                collection_name=self.collection_name,
-                persistence_path=self.persistence_path,
-                embedding_function=self.tongyi_embedding_function,  # 传递自定义嵌入函数
-                k=self.retrieve_k,
-                score_threshold=self.retrieve_score_threshold,
-            )
-            logger.info(f"ChromaDB配置准备就绪。")
-
-            self.vector_memory = ChromaDBVectorMemory(config=chroma_config)
-            logger.info("ChromaDBVectorMemory已实例化。")
+            # 嵌入函数、ChromaDB 客户端与集合的创建均为同步阻塞操作，放到线程中执行，
+            # 启动期间事件循环仍可处理健康检查等请求
+            await asyncio.to_thread(self._build_vector_memory)
 
             # 以前这里会写入一条 "系统初始化测试条目" 用于连通性测试。
             # 在持久化场景下，这条测试记录会反复累积并干扰召回。
@@ -233,6 +213,39 @@ class KnowledgeRetriever:
             # OpenAI embedding function does not require explicit session closing
             raise  # 重新抛出异常，让调用者知道失败了
 
+    def _build_vector_memory(self) -> None:
+        """创建嵌入函数和ChromaDB向量内存，并预先打开持久化集合（同步，在线程中调用）"""
+        self.tongyi_embedding_function = TongyiQWenOpenAIEmbeddingFunction(
+            api_key=self.tongyi_api_key,
+            model_name=self.embedding_model_name,
+            base_url=self.tongyi_base_url,
+            dimensions=self.embedding_dimensions,
+        )
+        logger.info("通义千问OpenAI兼容嵌入函数已创建。")
+
+        if self.persistence_path:
+            os.makedirs(self.persistence_path, exist_ok=True)
+            logger.info(f"持久化路径 '{self.persistence_path}' 已确认/创建。")
+
+        chroma_config = PersistentChromaDBVectorMemoryConfig(
+            collection_name=self.collection_name,
+            persistence_path=self.persistence_path,
+            embedding_function=self.tongyi_embedding_function,  # 传递自定义嵌入函数
+            k=self.retrieve_k,
+            score_threshold=self.retrieve_score_threshold,
+        )
+        logger.info(f"ChromaDB配置准备就绪。")
+
+        self.vector_memory = ChromaDBVectorMemory(config=chroma_config)
+        logger.info("ChromaDBVectorMemory已实例化。")
+
+        # ChromaDBVectorMemory 在首次查询时才打开客户端和集合，这里提前完成，
+        # 避免首个用户请求在事件循环中承担这部分开销
+        ensure_initialized = getattr(self.vector_memory, "_ensure_initialized", None)
+        if ensure_initialized is not None:
+            ensure_initialized()
+            logger.info("ChromaDB集合已预先打开。")
+
     async def add_documents(
         self,
         documents: List[Dict[str, Any]],
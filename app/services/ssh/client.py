@@ -62,7 +62,7 @@ class SSHClient:
                 key = paramiko.RSAKey.from_private_key_file(os.path.expanduser(self.key_path))
                 
                 # 使用run_in_executor在线程池中执行阻塞操作
-                loop = asyncio.get_event_loop()
+                loop = asyncio.get_running_loop()
                 await loop.run_in_executor(
                     None,
                     lambda: self.client.connect(
@@ -76,7 +76,7 @@ class SSHClient:
             # 如果没有密钥或密钥连接失败，尝试使用密码连接
             elif self.password:
                 # 使用run_in_executor在线程池中执行阻塞操作
-                loop = asyncio.get_event_loop()
+                loop = asyncio.get_running_loop()
                 await loop.run_in_executor(
                     None,
                     lambda: self.client.connect(
@@ -128,7 +128,7 @@ class SSHClient:
                 logger.warning(f"[SSH-DEBUG] 检测到交互式命令: {command}")
             
             # 使用run_in_executor在线程池中执行阻塞操作
-            loop = asyncio.get_event_loop()
+            loop = asyncio.get_running_loop()
             
             logger.info(f"[SSH-DEBUG] 开始执行命令...")
             # 执行命令
@@ -205,7 +205,7 @@ class SSHClient:
             logger.info(f"上传文件 {local_path} 到 {self.host}:{remote_path}")
             
             # 使用run_in_executor在线程池中执行阻塞操作
-            loop = asyncio.get_event_loop()
+            loop = asyncio.get_running_loop()
             
             # 创建SFTP客户端
             sftp = await loop.run_in_executor(
@@ -252,7 +252,7 @@ class SSHClient:
             logger.info(f"从 {self.host}:{remote_path} 下载文件到 {local_path}")
             
             # 使用run_in_executor在线程池中执行阻塞操作
-            loop = asyncio.get_event_loop()
+            loop = asyncio.get_running_loop()
             
             # 创建SFTP客户端
             sftp = await loop.run_in_executor(
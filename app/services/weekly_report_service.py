@@ -12,11 +12,12 @@ from loguru import logger
 from app.utils.time_utils import get_beijing_now, get_beijing_time_str
 
 from app.db_utils import (
-    get_first_user_id,
+    aget_first_user_id,
+    asave_weekly_log,
+    aget_weekly_logs_by_date_range,
     save_weekly_log,
     update_weekly_log_summary,
     update_weekly_log_dingtalk_id,
-    get_weekly_logs_by_date_range,
     get_latest_weekly_log,
 )
 from app.services.ai.weekly_report_agent import weekly_report_agent
@@ -248,7 +249,7 @@ class WeeklyReportService:
         try:
             # 获取用户ID
             if not user_id:
-                user_id = get_first_user_id()
+                user_id = await aget_first_user_id()
                 if not user_id:
                     return {"success": False, "message": "未找到用户信息", "data": None}
 
@@ -270,7 +271,7 @@ class WeeklyReportService:
                 )
 
                 # 查询数据库中的日志
-                logs = get_weekly_logs_by_date_range(user_id, week_start, thursday)
+                logs = await aget_weekly_logs_by_date_range(user_id, week_start, thursday)
 
                 # 如果数据库中没有，创建示例数据
                 if not logs:
@@ -362,7 +363,7 @@ class WeeklyReportService:
         try:
             # 获取用户ID
             if not user_id:
-                user_id = get_first_user_id()
+                user_id = await aget_first_user_id()
                 if not user_id:
                     return {"success": False, "message": "未找到用户信息", "data": None}
 
@@ -420,7 +421,7 @@ class WeeklyReportService:
                 logger.info(f"钉钉日报创建成功: report_id={report_id}")
                 # 保存到数据库
                 week_start, week_end = self.get_current_week_dates()
-                log_id = save_weekly_log(
+                log_id = await asave_weekly_log(
                     user_id=user_id,
                     week_start=week_start,
                     week_end=week_end,
@@ -471,7 +472,7 @@ class WeeklyReportService:
         try:
             # 获取用户ID
             if not user_id:
-                user_id = get_first_user_id()
+                user_id = await aget_first_user_id()
                 if not user_id:
                     return {"success": False, "message": "未找到用户信息", "data": None}
 
@@ -525,7 +526,7 @@ class WeeklyReportService:
                 logger.info(f"钉钉日报内容保存成功: report_id={report_id}")
                 # 保存到数据库
                 week_start, week_end = self.get_current_week_dates()
-                log_id = save_weekly_log(
+                log_id = await asave_weekly_log(
                     user_id=user_id,
                     week_start=week_start,
                     week_end=week_end,
@@ -682,7 +683,7 @@ class WeeklyReportService:
         try:
             # 如果没有提供用户ID，使用第一个用户
             if not user_id:
-                user_id = get_first_user_id()
+                user_id = await aget_first_user_id()
                 if not user_id:
                     return {"success": False, "message": "未找到有效用户", "data": None}
 
@@ -695,7 +696,7 @@ class WeeklyReportService:
             logger.info(f"从本地数据库查询用户 {user_id} 从 {start_date} 到 {end_date} 的周报日志")
 
             # 查询数据库中的日志
-            logs = get_weekly_logs_by_date_range(user_id, start_date, end_date)
+            logs = await aget_weekly_logs_by_date_range(user_id, start_date, end_date)
 
             # 处理日志数据
             processed_logs = []
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+异步工具模块，提供在默认线程池中执行阻塞函数的辅助方法
+"""
+
+import asyncio
+import contextvars
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+def run_blocking(func: Callable[..., T], /, *args: Any, **kwargs: Any) -> "asyncio.Future[T]":
+    """
+    在事件循环的默认线程池中执行阻塞函数，返回可 await 的 Future
+
+    与 asyncio.to_thread 行为一致（保留 contextvars 上下文），
+    但当前上下文为空或未传关键字参数时，跳过 ctx.run / partial 包装，直接提交给线程池。
+
+    Args:
+        func: 要执行的同步函数
+        *args: 位置参数
+        **kwargs: 关键字参数
+
+    Returns:
+        asyncio.Future: 函数执行结果
+    """
+    loop = asyncio.get_running_loop()
+    if kwargs:
+        func = partial(func, **kwargs)
+    ctx = contextvars.copy_context()
+    if not ctx:
+        return loop.run_in_executor(None, func, *args)
+    return loop.run_in_executor(None, ctx.run, func, *args)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cron 表达式工具模块，计算标准 5 段 cron 表达式的下一次触发时间
+"""
+
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, FrozenSet, Tuple
+
+# 字段名称别名（大小写不敏感）
+_MONTH_NAMES: Dict[str, int] = {
+    name: index
+    for index, name in enumerate(
+        ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"],
+        start=1,
+    )
+}
+_WEEKDAY_NAMES: Dict[str, int] = {
+    name: index for index, name in enumerate(["SUN", "MON", "TUE", "WED", "THU", "FRI", "SAT"])
+}
+
+# (最小值, 最大值, 名称别名)：分 时 日 月 周
+_FIELD_SPECS: Tuple[Tuple[int, int, Dict[str, int]], ...] = (
+    (0, 59, {}),
+    (0, 23, {}),
+    (1, 31, {}),
+    (1, 12, _MONTH_NAMES),
+    (0, 7, _WEEKDAY_NAMES),
+)
+
+# 最多向后搜索的天数，防止 "0 0 31 2 *" 这类永远不会触发的表达式死循环
+_MAX_SEARCH_DAYS = 366 * 5
+
+
+def _parse_value(token: str, names: Dict[str, int]) -> int:
+    """解析单个字段值，支持数字和名称别名"""
+    upper = token.upper()
+    if upper in names:
+        return names[upper]
+    return int(token)
+
+
+def _parse_field(field: str, minimum: int, maximum: int, names: Dict[str, int]) -> FrozenSet[int]:
+    """解析单个 cron 字段，支持 ``*``、列表、范围和步长"""
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_str = part.split("/", 1)
+            step = int(step_str)
+            if step <= 0:
+                raise ValueError(f"cron 步长必须为正数: {field}")
+
+        if part == "*":
+            start, end = minimum, maximum
+        elif "-" in part:
+            start_str, end_str = part.split("-", 1)
+            start, end = _parse_value(start_str, names), _parse_value(end_str, names)
+        else:
+            start = _parse_value(part, names)
+            end = maximum if step > 1 else start
+
+        if start < minimum or end > maximum or start > end:
+            raise ValueError(f"cron 字段超出范围: {field}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+@lru_cache(maxsize=64)
+def parse_cron(expression: str) -> Tuple[FrozenSet[int], ...]:
+    """
+    解析 5 段 cron 表达式，结果按表达式缓存
+
+    Args:
+        expression: cron 表达式，格式为 "分 时 日 月 周"
+
+    Returns:
+        Tuple[FrozenSet[int], ...]: 各字段允许的取值集合
+    """
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError(f"cron 表达式必须包含 5 个字段: {expression}")
+
+    minutes, hours, days, months, weekdays = (
+        _parse_field(field, *spec) for field, spec in zip(fields, _FIELD_SPECS)
+    )
+    # 周字段中 7 与 0 均表示周日
+    if 7 in weekdays:
+        weekdays = (weekdays - {7}) | {0}
+    return minutes, hours, days, months, weekdays
+
+
+def next_fire_time(expression: str, after: datetime) -> datetime:
+    """
+    计算 cron 表达式在指定时间之后的下一次触发时间
+
+    Args:
+        expression: cron 表达式，格式为 "分 时 日 月 周"
+        after: 起始时间（不含），通常为当前本地时间
+
+    Returns:
+        datetime: 下一次触发时间（秒和微秒为0）
+    """
+    minutes, hours, days, months, weekdays = parse_cron(expression)
+    # 与标准 cron 一致：日和周同时受限时，满足任意一个即可触发
+    day_restricted = len(days) < 31
+    weekday_restricted = len(weekdays) < 7
+
+    start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    for offset in range(_MAX_SEARCH_DAYS):
+        day = start + timedelta(days=offset)
+        if offset:
+            day = day.replace(hour=0, minute=0)
+        if day.month not in months:
+            continue
+
+        day_match = day.day in days
+        weekday_match = (day.weekday() + 1) % 7 in weekdays
+        if day_restricted and weekday_restricted:
+            if not (day_match or weekday_match):
+                continue
+        elif not (day_match and weekday_match):
+            continue
+
+        for hour in sorted(h for h in hours if h >= day.hour):
+            first_minute = day.minute if hour == day.hour else 0
+            candidates = [m for m in minutes if m >= first_minute]
+            if candidates:
+                return day.replace(hour=hour, minute=min(candidates))
+
+    raise ValueError(f"cron 表达式在 {_MAX_SEARCH_DAYS} 天内没有触发时间: {expression}")
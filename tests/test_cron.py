@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+测试 cron 表达式下一次触发时间计算
+"""
+
+import sys
+import os
+from datetime import datetime
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.cron import next_fire_time, parse_cron
+
+
+def test_workday_jira_check():
+    """工作日 10:00 / 16:00 的 JIRA 检查"""
+    expr = "0 10,16 * * MON-FRI"
+    # 2025-06-02 是周一
+    assert next_fire_time(expr, datetime(2025, 6, 2, 9, 30)) == datetime(2025, 6, 2, 10, 0)
+    assert next_fire_time(expr, datetime(2025, 6, 2, 10, 0)) == datetime(2025, 6, 2, 16, 0)
+    # 周五 16:00 之后跳过周末到下周一
+    assert next_fire_time(expr, datetime(2025, 6, 6, 16, 0)) == datetime(2025, 6, 9, 10, 0)
+
+
+def test_daily_and_weekly_jobs():
+    """每日与每周任务"""
+    assert next_fire_time("0 2 * * *", datetime(2025, 6, 2, 2, 0, 30)) == datetime(2025, 6, 3, 2, 0)
+    # 2025-06-07 是周六
+    assert next_fire_time("30 20 * * SAT", datetime(2025, 6, 2, 12, 0)) == datetime(2025, 6, 7, 20, 30)
+
+
+def test_parse_cron_fields():
+    """字段解析：步长、列表以及周日的两种写法"""
+    minutes, hours, _, _, weekdays = parse_cron("*/15 8-10 * * 0,7")
+    assert minutes == {0, 15, 30, 45}
+    assert hours == {8, 9, 10}
+    assert weekdays == {0}
+
+
+if __name__ == "__main__":
+    test_workday_jira_check()
+    test_daily_and_weekly_jobs()
+    test_parse_cron_fields()
+    print("✅ cron 测试通过")
@@ -23,7 +23,7 @@ def test_send_private_message_parameter_format():
         # 模拟access_token获取
         with patch.object(client, 'get_access_token', return_value='mock_token'):
             # 模拟钉钉API调用
-            with patch('app.core.dingtalk_client.DingTalkRobotClient') as mock_robot_client:
+            with patch('alibabacloud_dingtalk.robot_1_0.client.Client') as mock_robot_client:
                 mock_client_instance = Mock()
                 mock_robot_client.return_value = mock_client_instance
                 mock_client_instance.batch_send_otowith_options.return_value = Mock()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+测试单次路由处理过的对话轮次会作为上下文交给后续追问
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autogen_core.models import AssistantMessage, CreateResult, RequestUsage, UserMessage
+
+import app.db_utils as db_utils
+import app.services.ai.handler as handler_module
+
+
+class _FakeRouterClient:
+    """记录每次调用收到的消息，并按顺序直接返回预设回答"""
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.calls = []
+
+    async def create(self, messages, tools=None, **kwargs):
+        self.calls.append(list(messages))
+        return CreateResult(
+            finish_reason="stop",
+            content=self.answers.pop(0),
+            usage=RequestUsage(prompt_tokens=0, completion_tokens=0),
+            cached=False,
+        )
+
+
+def _run_conversation(client, turns):
+    """在临时数据库上依次处理 turns 中的 (消息, 会话ID)，返回各轮回复"""
+
+    async def run():
+        with patch.object(handler_module, "get_openai_client", return_value=client):
+            handler = handler_module.AIMessageHandler()
+        replies = []
+        try:
+            for text, conversation_id in turns:
+                replies.append(await handler.process_message(text, "user_a", conversation_id))
+        finally:
+            await db_utils.aclose_conversation_writer()
+        return replies
+
+    original = db_utils.DB_PATH
+    db_utils.DB_PATH = os.path.join(tempfile.mkdtemp(), "conversation.db")
+    try:
+        return asyncio.run(run())
+    finally:
+        db_utils.close_shared_conn()
+        db_utils.DB_PATH = original
+
+
+def test_router_follow_up_sees_previous_turn():
+    """同一会话中的追问，路由模型能看到上一轮的提问和回答"""
+    client = _FakeRouterClient(["西湖、灵隐寺都值得一去。", "苏州可以去拙政园。"])
+    replies = _run_conversation(client, [("杭州有什么好玩的", "conv_1"), ("那苏州呢", "conv_1")])
+
+    assert replies == ["西湖、灵隐寺都值得一去。", "苏州可以去拙政园。"]
+    second_call = client.calls[1]
+    assert isinstance(second_call[1], UserMessage) and second_call[1].content == "杭州有什么好玩的"
+    assert isinstance(second_call[2], AssistantMessage) and second_call[2].content == "西湖、灵隐寺都值得一去。"
+    assert second_call[-1].content == "那苏州呢"
+
+
+def test_router_history_is_per_conversation():
+    """其他会话的对话轮次不会出现在路由模型的上下文中"""
+    client = _FakeRouterClient(["西湖、灵隐寺都值得一去。", "请问您想了解哪座城市？"])
+    _run_conversation(client, [("杭州有什么好玩的", "conv_1"), ("那苏州呢", "conv_2")])
+
+    second_call = client.calls[1]
+    assert len(second_call) == 2
+    assert second_call[-1].content == "那苏州呢"
+
+
+if __name__ == "__main__":
+    test_router_follow_up_sees_previous_turn()
+    test_router_history_is_per_conversation()
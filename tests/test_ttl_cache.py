@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+测试带过期时间的 LRU 缓存
+"""
+
+import sys
+import os
+import time
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.ttl_cache import TTLCache
+
+
+def test_lru_eviction():
+    """容量满时淘汰最久未使用的条目"""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # a 变为最近使用
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_ttl_expire():
+    """超过有效期后视为未命中"""
+    cache = TTLCache(maxsize=4, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert "a" not in cache
+
+
+if __name__ == "__main__":
+    test_lru_eviction()
+    test_ttl_expire()
+    print("✅ TTLCache 测试通过")
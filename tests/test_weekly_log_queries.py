@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+测试批量获取用户最新周报日志
+"""
+
+import os
+import sys
+import tempfile
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.db_utils as db_utils
+
+
+def _use_temp_db():
+    """切换到临时数据库，返回原路径"""
+    original = db_utils.DB_PATH
+    db_utils.DB_PATH = os.path.join(tempfile.mkdtemp(), "weekly_logs.db")
+    return original
+
+
+def _set_created_at(log_id: int, created_at: str):
+    with db_utils._shared_conn() as conn:
+        conn.execute("UPDATE weekly_logs SET created_at = ? WHERE id = ?", (created_at, log_id))
+
+
+def test_latest_weekly_logs_for_users():
+    """多个用户各取最新一条；同一秒内的多条取最后写入的一条；无记录的用户不出现在结果中"""
+    original = _use_temp_db()
+    try:
+        old_a = db_utils.save_weekly_log("user_a", "2025-06-02", "2025-06-08", "A 旧日志")
+        first_a = db_utils.save_weekly_log("user_a", "2025-06-09", "2025-06-15", "A 日志 1")
+        second_a = db_utils.save_weekly_log("user_a", "2025-06-09", "2025-06-15", "A 日志 2")
+        only_b = db_utils.save_weekly_log("user_b", "2025-06-09", "2025-06-15", "B 日志")
+        _set_created_at(old_a, "2025-06-08 18:00:00")
+        _set_created_at(first_a, "2025-06-15 18:00:00")
+        _set_created_at(second_a, "2025-06-15 18:00:00")
+
+        latest = db_utils.get_latest_weekly_logs_for_users(["user_a", "user_b", "user_c"])
+        assert set(latest) == {"user_a", "user_b"}
+        assert latest["user_a"][0] == second_a
+        assert latest["user_b"][0] == only_b
+        # 单用户查询与批量查询结果一致
+        assert db_utils.get_latest_weekly_log("user_a")[0] == second_a
+    finally:
+        db_utils.close_shared_conn()
+        db_utils.DB_PATH = original
+
+
+def test_latest_weekly_logs_for_users_empty():
+    """空用户列表和没有任何日志的用户都返回空结果"""
+    original = _use_temp_db()
+    try:
+        assert db_utils.get_latest_weekly_logs_for_users([]) == {}
+        assert db_utils.get_latest_weekly_logs_for_users(["nobody"]) == {}
+    finally:
+        db_utils.close_shared_conn()
+        db_utils.DB_PATH = original
+
+
+if __name__ == "__main__":
+    test_latest_weekly_logs_for_users()
+    test_latest_weekly_logs_for_users_empty()